@@ -1,18 +1,166 @@
-import google.generativeai as genai
+import atexit
+import hashlib
 import json
+import os
 import requests
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from google.api_core import exceptions as api_exceptions
+
+from attachments import Attachment, AttachmentError, AttachmentStore
+from cache import ResponseCache, StageMemo
+from clients import ClientPool
+from compaction import dumps, expand_risk_ids, project_risks, project_tradeoffs, savings
+from ratelimit import QuotaExhaustedError, estimate_tokens
+from routing import LatencyBudgetExceeded
+from schemas import AGENT_SCHEMAS, parse_response
+from telemetry import RunMetrics, append_jsonl, payload_bytes, usage_tokens
+
+# One ModelHandle per API key, shared by every session that uses that key.
+client_pool = ClientPool()
+
+# Identical prompts (same text and attachment bytes) are answered from here
+# instead of spending quota. Set SHADOW_TPM_CACHE_DB to also keep responses
+# on disk across restarts.
+response_cache = ResponseCache(db_path=os.environ.get("SHADOW_TPM_CACHE_DB"))
+
+
+# Uploads by content hash: each file is read, hashed and text-extracted once,
+# and images are uploaded to the File API once per key.
+attachment_store = AttachmentStore()
+atexit.register(attachment_store.clear)
+
+# Document excerpt budgets (characters) for agents that read the upload.
+DOCUMENT_CHARS = {"risk_forecaster": 12000, "ethics_checker": 3000, "talent_risk_simulator": 3000, "fast_analyst": 12000}
+
+
+# Set SHADOW_TPM_METRICS_LOG to append every model call to a JSON-lines file
+# (see telemetry.py for the Prometheus exporter).
+METRICS_LOG = os.environ.get("SHADOW_TPM_METRICS_LOG")
+
+
+# One model, through that model's rate limiter. A call still running after
+# `budget` seconds is abandoned with LatencyBudgetExceeded rather than retried.
+# With a fallback to go to, a quota error is not waited out either.
+def _call_model(handle, content, schema, model_name, budget, has_fallback=False):
+    backend, limiter = handle.model(model_name)
+
+    def attempt():
+        try:
+            return handle.generate_content(content, schema, model_name, budget)
+        except api_exceptions.DeadlineExceeded as e:
+            if budget is None:
+                raise
+            raise LatencyBudgetExceeded(f"{backend.model_name} took over {budget}s") from e
+
+    return limiter.call(
+        attempt,
+        estimate_tokens(content),
+        usage=lambda r: getattr(getattr(r, "usage_metadata", None), "total_token_count", 0),
+        retry_quota=not has_fallback,
+    )
+
+
+# Returns (text, cache_key, from_cache). Replies are not stored here; _ask
+# caches them only once they have parsed. The agent's routed model is tried
+# first; over its latency budget or out of quota, the next faster one is.
+def _generate(handle, content, agent, schema=None):
+    started = time.perf_counter()
+    candidates = handle.route(agent)
+    model = handle.model(candidates[0][0])[0].model_name
+    call = {"cache_hit": True, "retries": 0, "prompt_tokens": 0, "response_tokens": 0,
+            "payload_bytes": payload_bytes(content), "model": model}
+    key = response_cache.key(model, content)
+    text = response_cache.get(key) if getattr(handle, "use_cache", True) else None
+    from_cache = text is not None
+    if not from_cache:
+        fallbacks = []
+        for i, (model_name, budget) in enumerate(candidates):
+            try:
+                response, retries = _call_model(handle, content, schema, model_name, budget,
+                                                has_fallback=i < len(candidates) - 1)
+                break
+            except (LatencyBudgetExceeded, QuotaExhaustedError) as e:
+                if i == len(candidates) - 1:
+                    raise
+                fallbacks.append({"model": handle.model(model_name)[0].model_name, "reason": str(e)})
+        model = handle.model(model_name)[0].model_name
+        key = response_cache.key(model, content)
+        text = response.text
+        prompt_tokens, response_tokens = usage_tokens(response)
+        call.update(cache_hit=False, retries=retries, prompt_tokens=prompt_tokens, response_tokens=response_tokens,
+                    model=model)
+        if fallbacks:
+            call["fallbacks"] = fallbacks
+            if getattr(handle, "fallbacks", None) is not None:
+                handle.fallbacks.extend(fallbacks)
+        budget = handle.latency_budget(agent)
+        if budget is not None:
+            call.update(latency_budget_s=budget, over_budget=time.perf_counter() - started > budget)
+    if getattr(handle, "metrics", None) is not None:
+        handle.metrics.record(agent, started, **call)
+    return text, key, from_cache
+
+
+FIX_JSON_PROMPT = """
+    The text below was supposed to be a single JSON object matching this schema but could not be parsed ({problem}).
+    Schema: {schema}
+    Text: {text}
+
+    Return ONLY the corrected JSON object. Keep every value from the text; do not add commentary.
+    """
 
-generation_config = {
-    "response_mime_type": "application/json"
-}
 
-model = genai.GenerativeModel(
-    'gemini-3-flash-preview',  # Higher free quota than 3-flash
-    generation_config=generation_config
-)
+# Asks the model for JSON matching the agent's schema. The reply is repaired
+# locally when it is fenced, truncated or slightly malformed; only if that
+# fails is one "fix this JSON" call spent instead of failing the whole run.
+def _ask(handle, content, agent, error):
+    schema = AGENT_SCHEMAS[agent]
+    text, key, from_cache = _generate(handle, content, agent, schema)
+    parsed, problem = parse_response(text, schema)
+    if parsed is None:
+        fix_prompt = FIX_JSON_PROMPT.format(problem=problem, schema=json.dumps(schema), text=text)
+        fixed, _, _ = _generate(handle, fix_prompt, f"{agent}:repair", schema)
+        parsed, _ = parse_response(fixed, schema)
+    if parsed is None:
+        print("JSON Parse Error:", problem, "\nRaw response:", text)
+        return {"error": error, "raw": text}
+    if not from_cache:
+        response_cache.put(key, json.dumps(parsed))
+    return parsed
+
+# Serializes the compact projection an agent is sent and records how many
+# prompt tokens it saved over the full upstream JSON.
+def _compact(handle, agent, full, compact):
+    compact_json = dumps(compact)
+    if getattr(handle, "metrics", None) is not None:
+        handle.metrics.record_compaction(agent, savings(json.dumps(full), compact_json))
+    return compact_json
+
+# The parts of the uploaded document most relevant to `focus`, as a prompt
+# section; empty when there is no upload or it has no extractable text.
+def _document_context(attachment, agent, focus):
+    if attachment is None or not attachment.has_text:
+        return ""
+    excerpt = attachment.excerpt(focus, DOCUMENT_CHARS[agent])
+    return f"Relevant excerpts from the uploaded document ({attachment.name}):\n\"\"\"\n{excerpt}\n\"\"\""
+
+# The prompt plus the upload: relevant text excerpts when there are any,
+# otherwise the file itself. Returns an error dict if the file can't be sent.
+def _with_attachment(handle, prompt, project_input, attachment, agent):
+    content = [prompt]
+    if attachment is not None:
+        focus = f"{project_input} risk delay dependency vendor timeline milestone deadline budget capacity compliance staffing"
+        document = _document_context(attachment, agent, focus)
+        try:
+            content.append(document or attachment_store.file_part(handle, attachment))
+        except Exception as e:
+            return {"error": f"Error processing uploaded file ({attachment.name}): {str(e)}. Try again or skip upload."}
+    return content
 
 # ──────────────────────────────────────────────
-def risk_forecaster(project_input, uploaded_file=None):
+def risk_forecaster(handle, project_input, attachment=None):
 
     prompt = f"""
     You are a versatile Risk Forecaster Agent for Google-scale technical programs in January 2026.
@@ -27,71 +175,46 @@ def risk_forecaster(project_input, uploaded_file=None):
     - Compliance/Safety: regulatory, sustainability, safety audits
 
     Predict top 8-10 risks with probability, impact (High/Medium/Low), and explanation.
-    Output ONLY valid JSON: {{"risks": [{{"risk": "...", "probability": "XX%", "impact": "High/Medium/Low", "explanation": "..."}}]]}}
+    Output ONLY valid JSON: {{"risks": [{{"risk": "...", "probability": "XX%", "impact": "High/Medium/Low", "explanation": "..."}}]}}
     """
 
-    content = [prompt]
-    if uploaded_file is not None:
-        try:
-            file_bytes = uploaded_file.read()
-            mime_type = uploaded_file.type
-            
-            if len(file_bytes) > 20 * 1024 * 1024:
-                return {"error": "Uploaded file is too large (over 20MB). Please use a smaller file."}
-            
-            supported_mimes = {
-                'application/pdf': 'PDF document',
-                'application/vnd.openxmlformats-officedocument.wordprocessingml.document': 'Word document (.docx)',
-                'text/plain': 'Plain text file (.txt / Notepad)',
-                'image/png': 'PNG image',
-                'image/jpeg': 'JPEG/JPG image',
-                'image/jpg': 'JPG image'
-            }
-            
-            if mime_type not in supported_mimes:
-                return {"error": f"Unsupported file type ({uploaded_file.name}). Please upload PDF, Word (.docx), text (.txt), PNG, JPG/JPEG."}
-            
-            content.append({"mime_type": mime_type, "data": file_bytes})
-        except Exception as e:
-            return {"error": f"Error processing uploaded file ({uploaded_file.name}): {str(e)}. Try again or skip upload."}
-    
-    response = model.generate_content(content)
-    try:
-        parsed = json.loads(response.text)
-        return parsed
-    except json.JSONDecodeError as e:
-        print("JSON Parse Error:", e, "\nRaw response:", response.text)
-        return {"error": "Failed to parse risks", "raw": response.text}
+    content = _with_attachment(handle, prompt, project_input, attachment, "risk_forecaster")
+    if isinstance(content, dict):
+        return content
+    return _ask(handle, content, "risk_forecaster", "Failed to parse risks")
 
 # ──────────────────────────────────────────────
-def trade_off_optimizer(risks_data):
+def trade_off_optimizer(handle, risks_data):
+    risks_json = _compact(handle, "trade_off_optimizer", risks_data, project_risks(risks_data, "trade_off_optimizer"))
     prompt = f"""
     You are a Trade-Off Optimizer Agent for technical programs.
-    Input risks: {json.dumps(risks_data)}
+    Input risks: {risks_json}
 
     Suggest 3-4 mitigations per risk with trade-offs:
     - For software/ML: engineering effort, time, quality/safety
     - For infra: cost, time, risk reduction
-    Include notes if a mitigation reduces multiple risks simultaneously.
+    Include notes if a mitigation reduces multiple risks simultaneously, naming those risks by their "risk" text.
+    The ids (R1, R2, ...) are internal and never shown to readers: use each risk's full "risk" text, not its id, everywhere in the output.
+    Give time_impact as signed weeks (e.g. "-2 weeks" if it saves time, "+1 week" if it adds time) and cost_impact as signed $M (e.g. "+$1.5M", "-$0.2M" for a saving, "+$0M" if none).
     
-    Output ONLY valid JSON: {{"tradeoffs": [{{"risk": "...", "options": [{{"option": "...", "effort_impact": "...", "time_impact": "...", "quality_risk_reduction": "XX%", "multi_risk_note": "..."}}]}}]]}}
+    Output ONLY valid JSON: {{"tradeoffs": [{{"risk": "...", "options": [{{"option": "...", "effort_impact": "...", "time_impact": "+/-N weeks", "cost_impact": "+/-$XM", "quality_risk_reduction": "XX%", "multi_risk_note": "..."}}]}}]}}
     """
-    response = model.generate_content(prompt)
-    try:
-        parsed = json.loads(response.text)
-        return parsed
-    except json.JSONDecodeError as e:
-        print("JSON Parse Error:", e, "\nRaw response:", response.text)
-        return {"error": "Failed to parse trade-offs", "raw": response.text}
+    result = _ask(handle, prompt, "trade_off_optimizer", "Failed to parse trade-offs")
+    return result if "error" in result else expand_risk_ids(result, risks_data)
 
 # ──────────────────────────────────────────────
-def comms_influencer(risks_data, tradeoffs_data):
+def comms_influencer(handle, risks_data, tradeoffs_data):
+    inputs_json = _compact(
+        handle, "comms_influencer",
+        {"risks": risks_data, "tradeoffs": tradeoffs_data},
+        {"risks": project_risks(risks_data, "comms_influencer"), "tradeoffs": project_tradeoffs(tradeoffs_data, risks_data)},
+    )
     prompt = f"""
     You are a senior TPM Comms/Influencer Agent at Google.
     Focus on software/ML, infrastructure, compliance, and cross-team coordination.
 
-    Input risks: {json.dumps(risks_data)}
-    Input trade-offs: {json.dumps(tradeoffs_data)}
+    Input risks and top mitigation trade-offs (trade-offs reference risks by id): {inputs_json}
+    Readers never see the ids; name risks by their "risk" text in everything you write.
     
     Generate:
     1. Email draft to stakeholders (Subject + Greeting + Body + Closing)
@@ -104,18 +227,19 @@ def comms_influencer(risks_data, tradeoffs_data):
         "slide_outline": {{ "title": "...", "bullets": ["...", "..."] }}
     }}
     """
-    response = model.generate_content(prompt)
-    try:
-        return json.loads(response.text)
-    except:
-        return {"error": "Failed to generate comms"}
+    result = _ask(handle, prompt, "comms_influencer", "Failed to generate comms")
+    return result if "error" in result else expand_risk_ids(result, risks_data)
 
 # ──────────────────────────────────────────────
-def ethics_checker(project_input, risks_data):
+def ethics_checker(handle, project_input, risks_data, attachment=None):
+    risks_json = _compact(handle, "ethics_checker", risks_data, project_risks(risks_data, "ethics_checker"))
+    document = _document_context(attachment, "ethics_checker",
+                                 "carbon emissions energy sustainability regulatory privacy safety bias community")
     prompt = f"""
     You are an Ethics & Sustainability Agent for Google technical programs.
     Project: {project_input}
-    Risks: {json.dumps(risks_data)}
+    Risks: {risks_json}
+    {document}
     
     Flag ethical/sustainability concerns: carbon footprint, regulatory (e.g., EU AI Act), community impact, bias in decisions, safety red-teaming.
     Suggest 2-3 mitigations.
@@ -125,18 +249,18 @@ def ethics_checker(project_input, risks_data):
         "mitigations": [{{"mitigation": "...", "benefit": "..."}}]
     }}
     """
-    response = model.generate_content(prompt)
-    try:
-        return json.loads(response.text)
-    except:
-        return {"error": "Failed to check ethics"}
+    return _ask(handle, prompt, "ethics_checker", "Failed to check ethics")
 
 # ──────────────────────────────────────────────
-def talent_risk_simulator(project_input, risks_data):
+def talent_risk_simulator(handle, project_input, risks_data, attachment=None):
+    risks_json = _compact(handle, "talent_risk_simulator", risks_data, project_risks(risks_data, "talent_risk_simulator"))
+    document = _document_context(attachment, "talent_risk_simulator",
+                                 "team staffing headcount engineers hiring owners skills attrition burnout oncall")
     prompt = f"""
     You are a Talent Risk Simulator Agent for technical programs.
     Project: {project_input}
-    Risks: {json.dumps(risks_data)}
+    Risks: {risks_json}
+    {document}
     
     Predict 2-3 talent/resource risks (e.g., engineer churn, skill gaps, burnout).
     Suggest mitigations (recruitment, retention strategies).
@@ -146,50 +270,293 @@ def talent_risk_simulator(project_input, risks_data):
         "mitigations": [{{"mitigation": "...", "benefit": "..."}}]
     }}
     """
-    response = model.generate_content(prompt)
-    try:
-        return json.loads(response.text)
-    except:
-        return {"error": "Failed to simulate talent risks"}
+    return _ask(handle, prompt, "talent_risk_simulator", "Failed to simulate talent risks")
 
 # ──────────────────────────────────────────────
-def orchestrator(project_input, uploaded_file=None, user_api_key=""):
-    if not user_api_key.strip():
-        return {"error": "No Gemini API key provided. Please enter your own key in the sidebar to run simulations. Get a free key at https://aistudio.google.com/app/apikey"}
-
-    genai.configure(api_key=user_api_key)
-
-    risks = risk_forecaster(project_input, uploaded_file)
-    if "error" in risks:
-        return risks
-
-    ethics = ethics_checker(project_input, risks)
-    if "error" in ethics:
-        return ethics
-
-    tradeoffs = trade_off_optimizer(risks)
-    if "error" in tradeoffs:
-        return tradeoffs
-
-    comms = comms_influencer(risks, tradeoffs)
-    if "error" in comms:
-        return comms
-
-    talent = talent_risk_simulator(project_input, risks)
-    if "error" in talent:
-        return talent
-
-    final_output = {
-        "summary": "Simulation complete for your AI program.",
-        "risks": risks.get("risks", []),
-        "tradeoffs": tradeoffs.get("tradeoffs", []),
-        "comms": comms,
-        "ethics": ethics if "error" not in ethics else {},
-        "talent": talent if "error" not in talent else {}
-    }
+# Fast mode: risks, trade-offs, ethics and talent in one structured call.
+def fast_analyst(handle, project_input, attachment=None):
+
+    prompt = f"""
+    You are a Fast Analyst Agent doing quick risk triage for Google-scale technical programs in January 2026.
+    Input: {project_input}
+    If an uploaded file is provided, use it (e.g., timelines from PDF, dependencies from image) to inform the analysis.
+
+    In one pass, produce:
+    1. risks: top 6-8 risks (software/ML, infrastructure, talent, compliance) with probability, impact (High/Medium/Low) and a one-sentence explanation.
+    2. tradeoffs: for each risk, 2 mitigations with effort, time impact (signed weeks, e.g. "-2 weeks"), cost impact (signed $M, e.g. "+$1.5M") and quality/risk reduction. Use each risk's exact "risk" text.
+    3. ethics: 2 ethical/sustainability concerns (carbon, regulatory, community, bias, safety) and 2 mitigations.
+    4. talent: 2 talent/resource risks (churn, skill gaps, burnout) and 2 mitigations.
+    Keep every explanation short.
+
+    Output ONLY valid JSON: {{
+        "risks": [{{"risk": "...", "probability": "XX%", "impact": "High/Medium/Low", "explanation": "..."}}],
+        "tradeoffs": [{{"risk": "...", "options": [{{"option": "...", "effort_impact": "...", "time_impact": "+/-N weeks", "cost_impact": "+/-$XM", "quality_risk_reduction": "XX%", "multi_risk_note": "..."}}]}}],
+        "ethics": {{"concerns": [{{"concern": "...", "severity": "High/Medium/Low", "explanation": "..."}}], "mitigations": [{{"mitigation": "...", "benefit": "..."}}]}},
+        "talent": {{"talent_risks": [{{"risk": "...", "probability": "XX%", "impact": "High/Medium/Low", "explanation": "..."}}], "mitigations": [{{"mitigation": "...", "benefit": "..."}}]}}
+    }}
+    """
+
+    content = _with_attachment(handle, prompt, project_input, attachment, "fast_analyst")
+    if isinstance(content, dict):
+        return content
+    return _ask(handle, content, "fast_analyst", "Failed to parse fast analysis")
+
+# ──────────────────────────────────────────────
+# Each stage lists the stages whose output it consumes and the run inputs it
+# reads. Stages with no unfinished dependencies run side by side, so the
+# critical path is risks -> tradeoffs -> comms (three model round-trips)
+# instead of five.
+PIPELINE = {
+    "risks": ((), ("project_input", "file_hash"), lambda ctx: risk_forecaster(ctx["handle"], ctx["project_input"], ctx["attachment"])),
+    "ethics": (("risks",), ("project_input", "file_hash"), lambda ctx: ethics_checker(ctx["handle"], ctx["project_input"], ctx["risks"], ctx["attachment"])),
+    "tradeoffs": (("risks",), (), lambda ctx: trade_off_optimizer(ctx["handle"], ctx["risks"])),
+    "comms": (("risks", "tradeoffs"), (), lambda ctx: comms_influencer(ctx["handle"], ctx["risks"], ctx["tradeoffs"])),
+    "talent": (("risks",), ("project_input", "file_hash"), lambda ctx: talent_risk_simulator(ctx["handle"], ctx["project_input"], ctx["risks"], ctx["attachment"])),
+}
+
+# "fast" splits one fused call into the same sections (no model calls for the
+# split stages), then drafts comms from them: two round-trips instead of three
+# on the critical path and five in total.
+FAST_PIPELINE = {
+    "analysis": ((), ("project_input", "file_hash"), lambda ctx: fast_analyst(ctx["handle"], ctx["project_input"], ctx["attachment"])),
+    "risks": (("analysis",), (), lambda ctx: {"risks": ctx["analysis"]["risks"]}),
+    "tradeoffs": (("analysis",), (), lambda ctx: {"tradeoffs": ctx["analysis"]["tradeoffs"]}),
+    "ethics": (("analysis",), (), lambda ctx: ctx["analysis"]["ethics"]),
+    "talent": (("analysis",), (), lambda ctx: ctx["analysis"]["talent"]),
+    "comms": PIPELINE["comms"],
+}
+
+PIPELINES = {"thorough": PIPELINE, "fast": FAST_PIPELINE}
+# Stages that actually produce a section in each mode, for regenerate=.
+SECTION_SOURCES = {"fast": {"risks": "analysis", "tradeoffs": "analysis", "ethics": "analysis", "talent": "analysis"}}
+
+MAX_CONCURRENT_AGENTS = 3
+
+# Finished stages keyed by a fingerprint of exactly what they consumed, so a
+# rerun only recomputes the part of the graph whose inputs changed.
+stage_memo = StageMemo()
+
+
+def _fingerprint(name, deps, inputs, ctx):
+    digest = hashlib.sha256(f"{name}\0{ctx['handle'].model_name}".encode())
+    for key in inputs:
+        digest.update(f"\0{key}={ctx[key]}".encode())
+    for dep in deps:
+        digest.update(f"\0{dep}=".encode() + json.dumps(ctx[dep], sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+# Yields (stage, result) as stages finish. Stages found in stage_memo are
+# yielded without a model call unless named in `regenerate`, which forces a
+# fresh answer for that stage (and so for everything downstream of it).
+# A stage answered by a fallback model is not memoized: its fingerprint names
+# the primary model, and the next run should try that model again.
+# `stage_info`, if given, is filled with each stage's fingerprint and whether
+# it was reused. `fixed` maps stages to results to use as they are (e.g. the
+# sections of the run being edited); only stages something still needs run.
+def iter_pipeline(handle, project_input, uploaded_file=None, max_workers=MAX_CONCURRENT_AGENTS, pipeline=PIPELINE,
+                  regenerate=(), stage_info=None, fixed=None):
+    try:
+        attachment = uploaded_file if isinstance(uploaded_file, Attachment) else attachment_store.load(uploaded_file)
+    except AttachmentError as e:
+        yield "risks", {"error": str(e)}
+        return
+    except Exception as e:
+        yield "risks", {"error": f"Error processing uploaded file ({uploaded_file.name}): {str(e)}. Try again or skip upload."}
+        return
+    ctx = {"handle": handle, "project_input": project_input, "attachment": attachment,
+           "file_hash": attachment.sha256 if attachment else ""}
+    stage_info = {} if stage_info is None else stage_info
+    use_memo = getattr(handle, "use_cache", True)
+    pending = _needed(pipeline, fixed) if fixed else dict(pipeline)
+    for name, result in (fixed or {}).items():
+        stage_info[name] = {"fingerprint": None, "reused": True}
+        yield name, result
+        ctx[name] = result
+    running = {}
+    owned = {}  # stage -> (fingerprint, Future) other pipelines may be waiting on
+    joined = {}  # stage -> run, for stages awaited from another pipeline
+    handles = {}  # stage -> the handle its calls ran on, which collects their fallbacks
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        def submit(name, run, **overrides):
+            handles[name] = handle.bind(fallbacks=[], **overrides)
+            running[pool.submit(run, {**ctx, "handle": handles[name]})] = name
+
+        try:
+            while pending or running:
+                progressed = True
+                while progressed:  # a memo hit can unblock further stages straight away
+                    progressed = False
+                    ready = [name for name, (deps, _, _) in pending.items() if all(d in ctx for d in deps)]
+                    for name in ready:
+                        deps, inputs, run = pending.pop(name)
+                        fingerprint = _fingerprint(name, deps, inputs, ctx)
+                        fresh = name in regenerate or not use_memo
+                        reused = None if fresh else stage_memo.get(fingerprint)
+                        stage_info[name] = {"fingerprint": fingerprint, "reused": reused is not None}
+                        if reused is not None:
+                            yield name, reused
+                            ctx[name] = reused
+                            progressed = True
+                            continue
+                        if fresh:
+                            submit(name, run, **({"use_cache": False} if name in regenerate else {}))
+                            continue
+                        owner = Future()
+                        shared = stage_memo.join(fingerprint, owner)
+                        if shared is owner:
+                            owned[name] = (fingerprint, owner)
+                            submit(name, run)
+                        else:
+                            # Wait on the other pipeline's future directly, so
+                            # no worker thread is tied up.
+                            stage_info[name]["reused"] = True
+                            joined[name] = run
+                            running[shared] = name
+                if not running:
+                    if pending:
+                        raise ValueError(f"Unsatisfiable pipeline dependencies: {sorted(pending)}")
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {"error": f"The {name} agent failed: {e}"}
+                    if name in joined:
+                        run = joined.pop(name)
+                        if "error" in result:
+                            # The other pipeline failed or gave up; compute it here.
+                            stage_info[name]["reused"] = False
+                            submit(name, run)
+                            continue
+                    # Joined stages were memoized by the pipeline that ran them.
+                    if "error" not in result and name in handles and not handles[name].fallbacks:
+                        stage_memo.put(stage_info[name]["fingerprint"], result)
+                    if name in owned:
+                        fingerprint, owner = owned.pop(name)
+                        owner.set_result(result)
+                        stage_memo.leave(fingerprint, owner)
+                    yield name, result
+                    if "error" in result:
+                        for other, other_name in running.items():
+                            if other_name not in joined:
+                                other.cancel()
+                        return
+                    ctx[name] = result
+        finally:
+            for fingerprint, owner in owned.values():
+                owner.cancel()  # anyone waiting on it computes the stage themselves
+                stage_memo.leave(fingerprint, owner)
+
+
+def _needed(pipeline, fixed):
+    # The stages not in `fixed` that produce a section or feed one that runs.
+    needed = {}
+
+    def need(name):
+        if name not in fixed and name not in needed:
+            needed[name] = pipeline[name]
+            for dep in pipeline[name][0]:
+                need(dep)
+
+    for name in pipeline:
+        if name in SECTIONS:
+            need(name)
+    return {name: stage for name, stage in pipeline.items() if name in needed}
+
+
+def run_pipeline(handle, project_input, uploaded_file=None, max_workers=MAX_CONCURRENT_AGENTS, pipeline=PIPELINE,
+                 regenerate=()):
+    stages = {}
+    for name, result in iter_pipeline(handle, project_input, uploaded_file, max_workers, pipeline, regenerate):
+        if "error" in result:
+            return result
+        stages[name] = result
+    return stages
+
+
+def _section(name, result):
+    if name in ("risks", "tradeoffs"):
+        return result.get(name, [])
+    return result if "error" not in result else {}
+
+
+SECTIONS = ("risks", "tradeoffs", "comms", "ethics", "talent")
+
+
+def _stage_result(name, section):
+    # The inverse of _section.
+    return {name: section} if name in ("risks", "tradeoffs") else section
+
+
+def _final_output(stages):
+    final_output = {"summary": "Simulation complete for your AI program."}
+    for name in SECTIONS:
+        final_output[name] = _section(name, stages[name])
     return final_output
 
 
+# Yields ("<stage>", section) as each agent finishes, where section has the
+# same shape as final_output["<stage>"], then ("final", final_output).
+# A failure yields ("error", {...}) and ends the stream. Pass handle to run
+# against an existing ModelHandle instead of looking one up by key, and
+# regenerate=("comms",) etc. to recompute those sections even if unchanged.
+# With `previous` (an earlier final_output), every section not regenerated is
+# kept from it as is, so only the named sections call the model.
+# mode="fast" uses FAST_PIPELINE; the sections have the same shape.
+def orchestrator_stream(project_input, uploaded_file=None, user_api_key="", max_workers=MAX_CONCURRENT_AGENTS, handle=None,
+                        regenerate=(), mode="thorough", previous=None):
+    if mode not in PIPELINES:
+        yield "error", {"error": f"Unknown simulation mode {mode!r}; choose one of {', '.join(PIPELINES)}."}
+        return
+    if handle is None:
+        if not user_api_key.strip():
+            yield "error", {"error": "No Gemini API key provided. Please enter your own key in the sidebar to run simulations. Get a free key at https://aistudio.google.com/app/apikey"}
+            return
+        with client_pool.lease(user_api_key.strip()) as handle:
+            yield from orchestrator_stream(project_input, uploaded_file, "", max_workers, handle, regenerate, mode,
+                                           previous)
+        return
+
+    metrics = RunMetrics()
+    handle = handle.bind(metrics=metrics)
+
+    sources = SECTION_SOURCES.get(mode, {})
+    regenerate = tuple(sources.get(name, name) for name in regenerate)
+    fixed = {name: _stage_result(name, previous[name]) for name in SECTIONS
+             if previous and name in previous and sources.get(name, name) not in regenerate}
+    stages = {}
+    stage_info = {}
+    for name, result in iter_pipeline(handle, project_input, uploaded_file, max_workers, PIPELINES[mode], regenerate,
+                                      stage_info, fixed):
+        if "error" in result:
+            yield "error", result
+            return
+        stages[name] = result
+        if name in SECTIONS:
+            yield name, _section(name, result)
+
+    final_output = _final_output(stages)
+    final_output["mode"] = mode
+    final_output["metrics"] = metrics.summary()
+    final_output["stages"] = stage_info
+    if METRICS_LOG:
+        append_jsonl(METRICS_LOG, final_output["metrics"])
+    yield "final", final_output
+
+
+def orchestrator(project_input, uploaded_file=None, user_api_key="", max_workers=MAX_CONCURRENT_AGENTS, handle=None,
+                 regenerate=(), mode="thorough", previous=None):
+    for name, result in orchestrator_stream(project_input, uploaded_file, user_api_key, max_workers, handle, regenerate,
+                                            mode, previous):
+        if name in ("error", "final"):
+            return result
+
+
 if __name__ == "__main__":
     test_input = "Scaling a new 1GW TPU cluster in Texas, 9-month deadline, $500M budget, key vendors for power infrastructure and fiber cables."
     result = orchestrator(test_input, user_api_key="")  # No key for test — will show error
@@ -1,8 +1,19 @@
 import streamlit as st
+import hashlib
 import json
-import plotly.express as px
+import sqlite3
+import time
+import uuid
 import pandas as pd
-from agents import orchestrator
+from agents import PIPELINES, SECTION_SOURCES, attachment_store, orchestrator, orchestrator_stream, response_cache
+from attachments import AttachmentError
+from dashboard import (probability_figure, heatmap_figure, impact_pie_figure, waterfall_figure, scenario_frames,
+                       scenario_probability_frame, scenario_delta_frame, scenario_delta_figure, scenario_impact_mix_frame,
+                       scenario_impact_mix_figure, scenario_summary_frame, history_trend_frame, history_profile_frame,
+                       history_trend_figure)
+from history import HistoryStore, fingerprint
+from normalize import display_frame, impact_summary, option_frame, risk_frame
+from scenarios import expand_scenarios, parse_variations, summarize_sweep, sweep_stream
 
 st.set_page_config(
     page_title="Shadow TPM",
@@ -56,239 +67,486 @@ uploaded_file = st.file_uploader(
     help="Gemini can read PDFs, Word docs, plain text files, or images (e.g., roadmaps, whiteboard sketches) to improve risk predictions."
 )
 
-if st.button("Run Simulation", type="primary"):
+SWEEP_MODE = "Scenario sweep"
+mode = st.radio("Mode", ["Single simulation", SWEEP_MODE], horizontal=True, key="mode")
+DEPTH_LABELS = {"thorough": "Thorough (five agents)", "fast": "Fast (two fused calls, for quick triage)"}
+depth = st.radio("Analysis depth", list(DEPTH_LABELS), format_func=DEPTH_LABELS.get, horizontal=True, key="depth")
+
+# ──────────────────────────────────────────────
+# Figure and table builders are memoized on the hash of the section they
+# draw, computed once per run. Arguments starting with "_" are not hashed by
+# Streamlit, so widget interactions redraw from cache without rebuilding.
+# Each section's strings are parsed into typed columns (normalize.py) once,
+# when it first arrives, and every chart and metric reads those columns.
+def section_hash(section):
+    return hashlib.sha256(json.dumps(section, sort_keys=True, default=str).encode()).hexdigest()
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def risk_figures(key, _risks):
+    df_prob = risk_frame(_risks)
+    return (
+        display_frame(df_prob),
+        probability_figure(df_prob),
+        heatmap_figure(df_prob),
+        impact_pie_figure(df_prob),
+    )
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def tradeoff_tables(key, _tradeoffs):
+    df_options = option_frame(_tradeoffs)
+    groups = dict(tuple(display_frame(df_options, "tradeoff", "risk").groupby(df_options["tradeoff"])))
+    tables = [groups.get(i, pd.DataFrame()).reset_index(drop=True) for i in range(len(_tradeoffs))]
+    return tables, impact_summary(df_options)
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def sweep_figures(key, _scenarios):
+    df_risks, df_options = scenario_frames(_scenarios)
+    df_matrix = scenario_probability_frame(df_risks)
+    df_delta = scenario_delta_frame(df_matrix)
+    df_mix = scenario_impact_mix_frame(df_risks, [s["label"] for s in _scenarios])
+    return (
+        df_matrix,
+        scenario_delta_figure(df_delta) if not df_delta.empty else None,
+        scenario_impact_mix_figure(df_mix),
+        scenario_summary_frame(_scenarios, df_risks, df_options),
+    )
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def trend_figures(key, _trend):
+    df_trend = history_trend_frame(_trend)
+    return history_profile_frame(_trend), history_trend_figure(df_trend) if not df_trend.empty else None
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def metrics_figures(key, _metrics):
+    df_agents = pd.DataFrame.from_dict(_metrics.get("agents", {}), orient="index")
+    if "models" in df_agents:
+        df_agents["models"] = df_agents["models"].map(lambda models: ", ".join(f"{m} ×{n}" for m, n in models.items()))
+    return waterfall_figure(_metrics), df_agents
+
+
+def render_risks(risks, key):
+    st.subheader("Predicted Risks")
+    if risks:
+        df_table, fig_prob, fig_heat, fig_pie = risk_figures(key, risks)
+        st.dataframe(df_table, use_container_width=True)
+        st.plotly_chart(fig_prob, use_container_width=True)
+        st.plotly_chart(fig_heat, use_container_width=True)
+        st.plotly_chart(fig_pie, use_container_width=True)
+    else:
+        st.info("No risks detected.")
+
+
+def render_tradeoffs(tradeoffs, key):
+    st.subheader("Mitigation Trade-offs")
+    tables, summary = tradeoff_tables(key, tradeoffs)
+    for item, df_options in zip(tradeoffs, tables):
+        risk = item["risk"]
+        with st.expander(f"**Risk:** {risk} (Mitigation Options)"):
+            if not df_options.empty:
+                st.table(df_options)
+            else:
+                st.info("No trade-offs generated for this risk.")
+
+    # Key Impact Summary
+    st.subheader("Key Impact Summary")
+    if tradeoffs:
+        max_delay_reduction = summary["max_delay_reduction"]
+        min_cost_impact = summary["min_cost_impact"]
+        max_risk_reduction = summary["max_risk_reduction"]
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Max Delay Reduction", f"Up to {max_delay_reduction:g} weeks" if max_delay_reduction else "N/A", delta_color="normal")
+        col2.metric("Min Cost Impact", f"{'+' if min_cost_impact >= 0 else '-'}${abs(min_cost_impact):g}M" if min_cost_impact is not None else "N/A", delta_color="inverse")
+        col3.metric("Max Risk Reduction", f"{max_risk_reduction:g}%" if max_risk_reduction else "N/A", delta_color="normal")
+    else:
+        st.info("No trade-off metrics available yet.")
+
+
+def render_comms(comms, key=None):
+    st.subheader("Communication Artifacts")
+    if comms:
+        with st.expander("Stakeholder Email Draft"):
+            email = comms.get("email_draft", {})
+            st.markdown(f"**Subject:** {email.get('subject', 'N/A')}")
+            st.markdown(f"**Greeting:** {email.get('greeting', 'N/A')}")
+            st.text_area("Body:", value=email.get("body", "N/A"), height=200, key="email_body")
+            st.markdown(f"**Closing:** {email.get('closing', 'N/A')}")
+
+        st.markdown("**Talking Points for Exec Meeting**")
+        talking_points = comms.get("talking_points", [])
+        if talking_points:
+            for point in talking_points:
+                st.markdown(f"- {point}")
+        else:
+            st.info("No talking points generated.")
+
+        with st.expander("Exec Slide Outline"):
+            slide = comms.get("slide_outline", {})
+            st.markdown(f"**Title:** {slide.get('title', 'N/A')}")
+            bullets = slide.get("bullets", [])
+            if bullets:
+                for bullet in bullets:
+                    st.markdown(f"- {bullet}")
+            else:
+                st.info("No slide outline generated.")
+    else:
+        st.info("No communication artifacts generated (check if comms agent is enabled).")
+
+
+def render_ethics(ethics, key=None):
+    st.subheader("Ethics & Sustainability Review")
+    if ethics:
+        concerns = ethics.get("concerns", [])
+        if concerns:
+            df_concerns = pd.DataFrame(concerns)
+            st.dataframe(df_concerns)
+        else:
+            st.info("No major concerns flagged.")
+
+        mitigations = ethics.get("mitigations", [])
+        if mitigations:
+            st.markdown("**Suggested Mitigations**")
+            for m in mitigations:
+                st.markdown(f"- **{m['mitigation']}** → {m['benefit']}")
+    else:
+        st.info("Ethics check not available.")
+
+
+def render_talent(talent, key=None):
+    st.subheader("Talent & Resource Risk Simulation")
+    if talent:
+        talent_risks = talent.get("talent_risks", [])
+        if talent_risks:
+            df_talent = pd.DataFrame(talent_risks)
+            st.dataframe(df_talent)
+
+        mitigations = talent.get("mitigations", [])
+        if mitigations:
+            st.markdown("**Suggested Mitigations**")
+            for m in mitigations:
+                st.markdown(f"- **{m['mitigation']}** → {m['benefit']}")
+    else:
+        st.info("Talent simulation not available.")
+
+
+def render_metrics(metrics, key):
+    with st.expander("Performance Metrics (per-agent timing waterfall)"):
+        if not metrics.get("calls"):
+            st.info("No model calls recorded.")
+            return
+        fig_waterfall, df_agents = metrics_figures(key, metrics)
+        st.plotly_chart(fig_waterfall, use_container_width=True)
+        st.dataframe(df_agents, use_container_width=True)
+        if metrics.get("compaction"):
+            st.markdown("**Prompt compaction (estimated input tokens per agent)**")
+            st.dataframe(pd.DataFrame.from_dict(metrics["compaction"], orient="index"), use_container_width=True)
+
+
+SECTION_RENDERERS = {
+    "risks": (render_risks, "Forecasting risks..."),
+    "tradeoffs": (render_tradeoffs, "Optimizing mitigation trade-offs..."),
+    "comms": (render_comms, "Drafting stakeholder communications..."),
+    "ethics": (render_ethics, "Reviewing ethics & sustainability..."),
+    "talent": (render_talent, "Simulating talent & resource risks..."),
+}
+# Sections that can be recomputed on their own; everything upstream of them
+# is reused from the previous run when its inputs have not changed.
+REGENERABLE_SECTIONS = ("comms", "ethics", "talent")
+# ──────────────────────────────────────────────
+
+
+MAX_SESSION_RUNS = 10
+
+
+# Past runs on disk (see history.py), shared by every session of this server;
+# only enabled when SHADOW_TPM_HISTORY_DB is set.
+@st.cache_resource
+def open_history():
+    try:
+        return HistoryStore.from_env()
+    except (OSError, sqlite3.Error):
+        return None
+
+
+history = open_history()
+
+
+def render_summary(result, hashes):
+    st.subheader("Summary")
+    st.write(result["summary"])
+    render_metrics(result.get("metrics", {}), hashes.get("metrics"))
+
+
+# Finished runs live in st.session_state["runs"] keyed by run ID, with the
+# per-section hashes the memoized builders are keyed on, so any widget
+# interaction redraws the dashboard without calling the model again. Each
+# run keeps the inputs it was simulated from (description, mode, upload
+# hash) so its sections are regenerated from those, not from whatever the
+# widgets hold now. New results are also saved to the history store;
+# history_id marks a run that was reloaded from it.
+def store_result(result, project_input, label=None, history_id=None, attachment=None):
+    attachment_hash = attachment.sha256 if attachment is not None else None
+    if history is not None and history_id is None:
+        try:
+            history_id = history.save(result, project_input, label, attachment_hash)
+        except sqlite3.Error as e:
+            st.warning(f"Could not save this run to history: {e}")
+    runs = st.session_state.setdefault("runs", {})
+    run_id = uuid.uuid4().hex[:12]
+    runs[run_id] = {
+        "result": result,
+        "hashes": {name: section_hash(result.get(name)) for name in (*SECTION_RENDERERS, "metrics")},
+        "label": f"{time.strftime('%H:%M:%S')} · {label or project_input.strip()[:40]}",
+        "project_input": project_input,
+        "mode": result.get("mode", "thorough"),
+        "attachment": attachment_hash,
+        "title": label,
+        "fingerprint": fingerprint(project_input),
+        "history_id": history_id,
+    }
+    while len(runs) > MAX_SESSION_RUNS:
+        runs.pop(next(iter(runs)))
+    st.session_state["current_run"] = run_id
+    st.session_state.pop("email_body", None)  # show the new draft, not the old edit
+
+
+def load_attachment():
+    """(Attachment or None, error message or None) for the current upload."""
+    try:
+        return attachment_store.load(uploaded_file), None
+    except AttachmentError as e:
+        return None, str(e)
+    except Exception as e:
+        return None, f"Error processing uploaded file ({uploaded_file.name}): {str(e)}. Try again or skip upload."
+
+
+# The run's upload, if it had one and it is still in the attachment store;
+# False when it had one that has since been evicted.
+def run_attachment(run):
+    if not run.get("attachment"):
+        return None
+    return attachment_store.get(run["attachment"]) or False
+
+
+def regenerate_section(name, run):
+    attachment = run_attachment(run)
+    with st.spinner(f"Regenerating {name}..."):
+        result = orchestrator(run["project_input"], attachment, api_key_input, regenerate=(name,), mode=run["mode"],
+                              previous=run["result"])
+    if "error" in result:
+        st.error(f"Error: {result['error']}")
+    else:
+        store_result(result, run["project_input"], label=run.get("title"), attachment=attachment)
+        st.rerun()
+
+
+def render_trend(run):
+    if history is None:
+        return
+    trend = history.trend(run["fingerprint"])
+    if len(trend["runs"]) < 2:
+        return
+    with st.expander(f"Risk trend across {len(trend['runs'])} runs of this program"):
+        df_profile, fig_trend = trend_figures(tuple(r["id"] for r in trend["runs"]), trend)
+        st.dataframe(df_profile, use_container_width=True)
+        if fig_trend is not None:
+            st.plotly_chart(fig_trend, use_container_width=True)
+
+
+def render_run(run):
+    result, hashes = run["result"], run["hashes"]
+    if run.get("loaded"):
+        st.info(f"Loaded from history (run #{run['history_id']}). No model calls were made.")
+    else:
+        st.success("Simulation complete! 🚀 Risks & mitigations ready.")
+    render_summary(result, hashes)
+    render_trend(run)
+    # In fast mode most sections come from one fused call and can't be redone
+    # alone; sections that read the upload can't be once it is gone.
+    run_mode = result.get("mode", "thorough")
+    fused = SECTION_SOURCES.get(run_mode, {})
+    upload_gone = run_attachment(run) is False
+    for name, (render, _) in SECTION_RENDERERS.items():
+        render(result.get(name), hashes[name])
+        if ("project_input" in run and name in REGENERABLE_SECTIONS and name not in fused
+                and not (upload_gone and "file_hash" in PIPELINES[run_mode][name][1])
+                and st.button("🔄 Regenerate this section only", key=f"regenerate_{name}")):
+            regenerate_section(name, run)
+    if "project_input" in run and upload_gone:
+        st.caption("This run's uploaded file is no longer cached, so sections that read it can't be regenerated. Run the simulation again to refresh them.")
+
+    st.download_button(
+        label="Download Results as JSON",
+        data=json.dumps(result, indent=2),
+        file_name="shadow_tpm_simulation.json",
+        mime="application/json"
+    )
+
+
+def render_sweep(sweep):
+    scenarios = sweep["scenarios"]
+    df_matrix, fig_delta, fig_mix, df_summary = sweep_figures(sweep["key"], scenarios)
+    st.subheader("Scenario Comparison")
+    st.caption(f"{len(scenarios)} scenarios in {sweep['wall_s']:.1f}s · "
+               f"{sweep['stages_reused']} stages reused, {sweep['stages_run']} computed")
+
+    st.markdown("**Key Impact Summary by Scenario**")
+    st.dataframe(df_summary, use_container_width=True)
+
+    st.markdown(f"**Risk Probability (%)** · baseline: {scenarios[0]['label']}")
+    st.dataframe(df_matrix, use_container_width=True)
+    if fig_delta is not None:
+        st.plotly_chart(fig_delta, use_container_width=True)
+    st.plotly_chart(fig_mix, use_container_width=True)
+    st.info("Each scenario's full dashboard is available under \"This session's runs\" in Single simulation mode.")
+
+
+def run_sweep_mode():
+    variations_text = st.text_area(
+        "Scenario variations (one parameter per line, values separated by |)",
+        height=100,
+        placeholder="deadline: 9-month | 12-month\nbudget: $500M | $350M",
+        help="The first value of each parameter is the baseline. Write {deadline} in the description to substitute a value in place; otherwise the values are added as scenario assumptions.",
+    )
+    if st.button("Run Sweep", type="primary"):
+        variations = parse_variations(variations_text)
+        if not project_input.strip():
+            st.error("Please enter a project description.")
+        elif not api_key_input.strip():
+            st.error("Please enter your Gemini API key in the sidebar to run simulations.")
+        elif not variations:
+            st.error("Please enter at least one variation, e.g. \"deadline: 9-month | 12-month\".")
+        else:
+            try:
+                expected = len(expand_scenarios(project_input, variations))
+            except ValueError as e:
+                st.error(str(e))
+                return
+            attachment, attachment_error = load_attachment()
+            if attachment_error:
+                st.error(attachment_error)
+                return
+            progress = st.progress(0.0, text=f"Simulating {expected} scenarios...")
+            started = time.perf_counter()
+            finished = {}
+            for index, scenario in sweep_stream(project_input, variations, attachment, api_key_input, mode=depth):
+                finished[index] = scenario
+                progress.progress(len(finished) / expected, text=f"Finished {scenario['label']} ({len(finished)}/{expected})")
+            progress.empty()
+            sweep = summarize_sweep(finished, started)
+            for scenario in sweep["scenarios"]:
+                if "error" in scenario["result"]:
+                    st.error(f"{scenario['label']}: {scenario['result']['error']}")
+                else:
+                    store_result(scenario["result"], scenario["project_input"], label=scenario["label"], attachment=attachment)
+            sweep["key"] = section_hash([s["result"] for s in sweep["scenarios"]])
+            st.session_state["sweep"] = sweep
+    sweep = st.session_state.get("sweep")
+    if sweep and any("error" not in s["result"] for s in sweep["scenarios"]):
+        render_sweep(sweep)
+
+
+def render_history_sidebar():
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("Run History")
+    query = st.sidebar.text_input("Search past runs", placeholder="vendor, TPU, compliance...", key="history_query")
+    impact = st.sidebar.selectbox("With a risk of impact", ["Any", "High", "Medium", "Low"], key="history_impact")
+    min_probability = st.sidebar.slider("and probability of at least (%)", 0, 100, 0, step=5, key="history_min_probability")
+    matches = history.search(query, None if impact == "Any" else impact, min_probability)
+    if not matches:
+        st.sidebar.caption("No saved runs match." if history.stats()["runs"] else "Finished simulations are saved here.")
+        return
+    by_id = {m["id"]: m for m in matches}
+    selected = st.sidebar.selectbox(
+        f"{len(matches)} matching runs",
+        options=list(by_id),
+        format_func=lambda i: f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(by_id[i]['created']))} · "
+                              f"{by_id[i]['label'] or by_id[i]['project_input'].strip()[:40]} · "
+                              f"{by_id[i]['risks']} risks ({by_id[i]['high_risks']} high)",
+        key="history_selected",
+    )
+    if st.sidebar.button("Load run", key="history_load"):
+        loaded = history.load(selected)
+        if loaded is None:
+            st.sidebar.error("That run is no longer in the history.")
+            return
+        result, loaded_input, attachment_hash = loaded
+        store_result(result, loaded_input, label=by_id[selected]["label"], history_id=selected)
+        run = st.session_state["runs"][st.session_state["current_run"]]
+        run.update(loaded=True, attachment=attachment_hash,
+                   label=f"{time.strftime('%H:%M:%S')} · #{selected} {by_id[selected]['label'] or loaded_input.strip()[:36]}")
+        st.rerun()
+
+
+
+def run_simulation(attachment):
+    # Each section gets a placeholder up front and is filled in as soon as
+    # its agent finishes, instead of waiting for the whole pipeline.
+    status = st.empty()
+    summary_slot = st.empty()
+    slots = {}
+    for name, (_, waiting_message) in SECTION_RENDERERS.items():
+        slots[name] = st.empty()
+        slots[name].info(waiting_message)
+
+    status.info("Simulating program risks and trade-offs...")
+    result = {}
+    for name, section in orchestrator_stream(project_input, attachment, api_key_input, mode=depth):
+        if name in SECTION_RENDERERS:
+            with slots[name].container():
+                SECTION_RENDERERS[name][0](section, section_hash(section))
+        else:
+            result = section
+
+    if "error" in result:
+        st.session_state.pop("current_run", None)
+        status.error(f"Error: {result['error']}")
+        summary_slot.empty()
+        for slot in slots.values():
+            slot.empty()
+        if "raw" in result:
+            with st.expander("Technical Debug Info"):
+                st.code(result["raw"])
+    else:
+        # Rerun to show the finished dashboard from session state, with its
+        # per-section controls.
+        store_result(result, project_input, attachment=attachment)
+        st.rerun()
+
+
+if history is not None:
+    render_history_sidebar()
+
+
+if mode == SWEEP_MODE:
+    run_sweep_mode()
+elif st.button("Run Simulation", type="primary"):
     if not project_input.strip():
         st.error("Please enter a project description.")
     elif not api_key_input.strip():
         st.error("Please enter your Gemini API key in the sidebar to run simulations.")
     else:
-        with st.spinner("Simulating program risks and trade-offs..."):
-            result = orchestrator(project_input, uploaded_file, api_key_input)
-
-        if "error" in result:
-            st.error(f"Error: {result['error']}")
-            if "raw" in result:
-                with st.expander("Technical Debug Info"):
-                    st.code(result["raw"])
+        attachment, attachment_error = load_attachment()
+        if attachment_error:
+            st.error(attachment_error)
         else:
-            st.success("Simulation complete! 🚀 Risks & mitigations ready.")
-
-            # Summary
-            st.subheader("Summary")
-            st.write(result["summary"])
-
-            # Risks Section
-            st.subheader("Predicted Risks")
-            risks = result.get("risks", [])
-            if risks:
-                df_risks = pd.DataFrame(risks)
-                st.dataframe(df_risks, use_container_width=True)
-
-                # Risk Probability Bar Chart (aesthetics improved)
-                df_prob = df_risks.copy()
-                df_prob['probability_num'] = df_prob['probability'].str.rstrip('%').astype(float)
-                fig_prob = px.bar(
-                    df_prob,
-                    x='risk',
-                    y='probability_num',
-                    color='impact',
-                    title="Risk Probabilities (%) by Impact",
-                    labels={'probability_num': 'Probability (%)', 'risk': 'Risk'},
-                    height=500,
-                    color_discrete_map={
-                        'High': '#E74C3C',   # Rich red
-                        'Medium': '#F39C12', # Amber
-                        'Low': '#2ECC71'     # Green
-                    },
-                    text='probability_num'
-                )
-                fig_prob.update_traces(hovertemplate='<b>%{x}</b><br>Probability: %{y}%', texttemplate='%{text:.1f}%', textposition='outside')
-                fig_prob.update_layout(
-                    xaxis_tickangle=-45,
-                    xaxis_title="",
-                    yaxis_title="Probability (%)",
-                    font=dict(family="Arial, sans-serif", size=13),
-                    uniformtext_minsize=12,
-                    uniformtext_mode='hide',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    margin=dict(b=120),
-                    showlegend=True
-                )
-                st.plotly_chart(fig_prob, use_container_width=True)
-
-                # Risk Heatmap (aesthetics improved)
-                df_pivot = df_prob.pivot_table(
-                    index='risk',
-                    columns='impact',
-                    values='probability_num',
-                    aggfunc='first'
-                ).fillna(0)
-
-                fig_heat = px.imshow(
-                    df_pivot,
-                    title="Risk Heatmap (Probability by Impact)",
-                    color_continuous_scale=px.colors.sequential.Reds,
-                    height=450,
-                    labels=dict(x="Impact Level", y="Risk", color="Probability (%)"),
-                    text_auto=True,
-                    aspect="auto"
-                )
-                fig_heat.update_layout(
-                    xaxis_title="Impact Level",
-                    yaxis_title="Risk",
-                    xaxis_tickangle=-30,
-                    font=dict(family="Arial, sans-serif", size=12),
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    coloraxis_colorbar_title="Probability (%)",
-                )
-                st.plotly_chart(fig_heat, use_container_width=True)
-
-                # Impact Pie Chart (aesthetics improved)
-                impact_counts = df_risks['impact'].value_counts()
-                # Ensure the categories are in the correct order
-                impact_order = ["High", "Medium", "Low"]
-                impact_counts = impact_counts.reindex(impact_order, fill_value=0)
-
-                fig_pie = px.pie(
-                    values=impact_counts.values,
-                    names=impact_counts.index,
-                    title="Risk Impact Distribution",
-                    hole=0.4,
-                    color_discrete_map={"High": "#E74C3C", "Medium": "#F39C12", "Low": "#2ECC71"},
-                    height=420
-                )
-                fig_pie.update_traces(textposition='inside', textinfo='percent+label', pull=[0.05,0.02,0.02])
-                fig_pie.update_layout(font=dict(family="Arial, sans-serif", size=13), legend_title_text="Impact Level")
-                st.plotly_chart(fig_pie, use_container_width=True)
-            else:
-                st.info("No risks detected.")
-
-            # Trade-offs Section
-            st.subheader("Mitigation Trade-offs")
-            tradeoffs = result.get("tradeoffs", [])
-            for item in tradeoffs:
-                risk = item["risk"]
-                with st.expander(f"**Risk:** {risk} (Mitigation Options)"):
-                    options = item.get("options", [])
-                    if options:
-                        df_options = pd.DataFrame(options)
-                        st.table(df_options)
-                    else:
-                        st.info("No trade-offs generated for this risk.")
-
-            # Key Impact Summary
-            st.subheader("Key Impact Summary")
-            if tradeoffs:
-                max_delay_reduction = 0
-                min_cost_impact = float('inf')
-                max_risk_reduction = 0
-
-                for item in tradeoffs:
-                    for option in item.get("options", []):
-                        time_str = option.get("time_impact", "0")
-                        if "week" in time_str.lower():
-                            try:
-                                val = float(time_str.split()[0].replace("+", "").replace("-", ""))
-                                if "-" in time_str:
-                                    max_delay_reduction = max(max_delay_reduction, val)
-                            except:
-                                pass
-
-                        cost_str = option.get("cost_impact", "0")
-                        if "$" in cost_str:
-                            try:
-                                val = float(cost_str.replace("$", "").replace("M", "").replace("+", ""))
-                                min_cost_impact = min(min_cost_impact, val)
-                            except:
-                                pass
-
-                        risk_str = option.get("quality_risk_reduction", "0%")
-                        if "%" in risk_str:
-                            try:
-                                val = float(risk_str.rstrip("%"))
-                                max_risk_reduction = max(max_risk_reduction, val)
-                            except:
-                                pass
-
-                col1, col2, col3 = st.columns(3)
-                col1.metric("Max Delay Reduction", f"Up to {max_delay_reduction} weeks" if max_delay_reduction > 0 else "N/A", delta_color="normal")
-                col2.metric("Min Cost Impact", f"+${min_cost_impact}M" if min_cost_impact != float('inf') else "N/A", delta_color="inverse")
-                col3.metric("Max Risk Reduction", f"{max_risk_reduction}%" if max_risk_reduction > 0 else "N/A", delta_color="normal")
-            else:
-                st.info("No trade-off metrics available yet.")
-
-            # Communication Artifacts
-            st.subheader("Communication Artifacts")
-            comms = result.get("comms", {})
-            if comms:
-                with st.expander("Stakeholder Email Draft"):
-                    email = comms.get("email_draft", {})
-                    st.markdown(f"**Subject:** {email.get('subject', 'N/A')}")
-                    st.markdown(f"**Greeting:** {email.get('greeting', 'N/A')}")
-                    st.text_area("Body:", value=email.get("body", "N/A"), height=200, key="email_body")
-                    st.markdown(f"**Closing:** {email.get('closing', 'N/A')}")
-
-                st.markdown("**Talking Points for Exec Meeting**")
-                talking_points = comms.get("talking_points", [])
-                if talking_points:
-                    for point in talking_points:
-                        st.markdown(f"- {point}")
-                else:
-                    st.info("No talking points generated.")
-
-                with st.expander("Exec Slide Outline"):
-                    slide = comms.get("slide_outline", {})
-                    st.markdown(f"**Title:** {slide.get('title', 'N/A')}")
-                    bullets = slide.get("bullets", [])
-                    if bullets:
-                        for bullet in bullets:
-                            st.markdown(f"- {bullet}")
-                    else:
-                        st.info("No slide outline generated.")
-            else:
-                st.info("No communication artifacts generated (check if comms agent is enabled).")
-
-            # Ethics
-            st.subheader("Ethics & Sustainability Review")
-            ethics = result.get("ethics", {})
-            if ethics:
-                concerns = ethics.get("concerns", [])
-                if concerns:
-                    df_concerns = pd.DataFrame(concerns)
-                    st.dataframe(df_concerns)
-                else:
-                    st.info("No major concerns flagged.")
+            run_simulation(attachment)
+elif st.session_state.get("current_run") in st.session_state.get("runs", {}):
+    render_run(st.session_state["runs"][st.session_state["current_run"]])
 
-                mitigations = ethics.get("mitigations", [])
-                if mitigations:
-                    st.markdown("**Suggested Mitigations**")
-                    for m in mitigations:
-                        st.markdown(f"- **{m['mitigation']}** → {m['benefit']}")
-            else:
-                st.info("Ethics check not available.")
-
-            # Talent
-            st.subheader("Talent & Resource Risk Simulation")
-            talent = result.get("talent", {})
-            if talent:
-                talent_risks = talent.get("talent_risks", [])
-                if talent_risks:
-                    df_talent = pd.DataFrame(talent_risks)
-                    st.dataframe(df_talent)
-
-                mitigations = talent.get("mitigations", [])
-                if mitigations:
-                    st.markdown("**Suggested Mitigations**")
-                    for m in mitigations:
-                        st.markdown(f"- **{m['mitigation']}** → {m['benefit']}")
-            else:
-                st.info("Talent simulation not available.")
-
-            st.download_button(
-                label="Download Results as JSON",
-                data=json.dumps(result, indent=2),
-                file_name="shadow_tpm_simulation.json",
-                mime="application/json"
-            )
\ No newline at end of file
+session_runs = st.session_state.get("runs", {})
+if len(session_runs) > 1:
+    st.sidebar.selectbox(
+        "This session's runs",
+        options=list(reversed(session_runs)),
+        format_func=lambda run_id: session_runs[run_id]["label"],
+        key="current_run",
+    )
+
+cache_stats = response_cache.stats()
+st.sidebar.caption(f"Response cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses")
@@ -0,0 +1,340 @@
+import hashlib
+import io
+import math
+import re
+import tempfile
+import threading
+import time
+import weakref
+import zipfile
+from array import array
+from collections import Counter, OrderedDict
+from xml.etree import ElementTree
+
+try:
+    import pypdf
+except ImportError:  # optional: without it PDFs are sent to the model as files
+    pypdf = None
+
+# Uploads are read once, in chunks, into a spooled temp file while being
+# hashed. Text is extracted locally from .txt/.docx/.pdf, split into chunks
+# and only the chunks relevant to a prompt are sent; images (and PDFs with
+# no extractable text) go to the model as a file, uploaded once per API key
+# where the backend supports it. Everything is keyed by the upload's sha256,
+# so reruns and other agents reuse it for free. Extracted text is spooled
+# too; an Attachment keeps only chunk offsets in memory and reads the chunks
+# it scores or sends.
+
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+SPOOL_BYTES = 1024 * 1024
+READ_BYTES = 256 * 1024
+CHUNK_CHARS = 1200
+
+SUPPORTED_MIMES = {
+    'application/pdf': 'PDF document',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document': 'Word document (.docx)',
+    'text/plain': 'Plain text file (.txt / Notepad)',
+    'image/png': 'PNG image',
+    'image/jpeg': 'JPEG/JPG image',
+    'image/jpg': 'JPG image'
+}
+
+DOCX_MIME = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+_WORD = re.compile(r"[a-z0-9]{3,}")
+_W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+class AttachmentError(ValueError):
+    pass
+
+
+class Attachment:
+    """One upload: its hash, a spooled copy of the bytes and of its extracted
+    text chunks, with only the chunks' offsets held in memory."""
+
+    def __init__(self, name, mime_type, sha256, size, spool):
+        self.name = name
+        self.mime_type = mime_type
+        self.sha256 = sha256
+        self.size = size
+        self.text_chars = 0
+        self._spool = spool
+        self._text = None
+        self._offsets = array("q", [0])  # chunk i is bytes offsets[i]:offsets[i + 1] of _text
+        self._lengths = array("q")  # characters per chunk
+        self._excerpts = {}
+        self._lock = threading.Lock()
+
+    @property
+    def has_text(self):
+        return bool(self._lengths)
+
+    def add_chunks(self, chunks):
+        """Spool text chunks (any iterable) after those already added; if the
+        iterable raises, none of its chunks are kept."""
+        with self._lock:
+            if self._text is None:
+                self._text = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+            kept, chars = len(self._lengths), self.text_chars
+            self._text.seek(self._offsets[-1])
+            try:
+                for chunk in chunks:
+                    data = chunk.encode("utf-8")
+                    self._text.write(data)
+                    self._offsets.append(self._offsets[-1] + len(data))
+                    self._lengths.append(len(chunk))
+                    self.text_chars += len(chunk)
+            except BaseException:
+                del self._offsets[kept + 1:]
+                del self._lengths[kept:]
+                self.text_chars = chars
+                raise
+
+    def chunk(self, i):
+        with self._lock:
+            self._text.seek(self._offsets[i])
+            return self._text.read(self._offsets[i + 1] - self._offsets[i]).decode("utf-8")
+
+    def iter_chunks(self):
+        for i in range(len(self._lengths)):
+            yield self.chunk(i)
+
+    def read(self):
+        with self._lock:
+            self._spool.seek(0)
+            return self._spool.read()
+
+    def open_copy(self):
+        # A private file object for APIs that read from a file themselves.
+        copy = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+        with self._lock:
+            self._spool.seek(0)
+            while block := self._spool.read(READ_BYTES):
+                copy.write(block)
+        copy.seek(0)
+        return copy
+
+    def excerpt(self, query, max_chars):
+        """The chunks most relevant to `query`, in document order, within max_chars."""
+        if not self.has_text or max_chars <= 0:
+            return ""
+        if self.text_chars <= max_chars:
+            return "\n\n".join(self.iter_chunks())
+        with self._lock:
+            cached = self._excerpts.get((query, max_chars))
+        if cached is not None:
+            return cached
+        scores = _score(self.iter_chunks(), query)
+        chosen, used = [], 0
+        for i in sorted(range(len(scores)), key=lambda i: (-scores[i], i)):
+            if used + self._lengths[i] > max_chars:
+                continue
+            chosen.append(i)
+            used += self._lengths[i]
+        excerpt = "\n\n".join(self.chunk(i) for i in sorted(chosen))
+        with self._lock:
+            self._excerpts[(query, max_chars)] = excerpt
+        return excerpt
+
+    def close(self):
+        self._spool.close()
+        if self._text is not None:
+            self._text.close()
+
+
+def _terms(text):
+    return _WORD.findall(text.lower())
+
+
+def _score(chunks, query):
+    # TF-IDF over the query's terms only, normalized by chunk length, in one
+    # pass over `chunks` (any iterable). Substring counts keep this to a few
+    # C calls per chunk (and let "risk" match "risks"), which matters on a
+    # 20MB text file.
+    query_terms = set(_terms(query))
+    counts, lengths = [], []
+    for chunk in chunks:
+        lowered = chunk.lower()
+        counts.append({t: n for t in query_terms if (n := lowered.count(t))})
+        lengths.append(len(chunk))
+    df = Counter(term for c in counts for term in c)
+    return [
+        sum(n * math.log(1 + len(counts) / df[t]) for t, n in c.items()) / (length or 1)
+        for c, length in zip(counts, lengths)
+    ]
+
+
+# Groups lines into paragraphs at blank lines. A run of text with no blank
+# lines is cut every `size` characters so it never accumulates in memory.
+def _paragraphs(lines, size=CHUNK_CHARS):
+    paragraph, length = [], 0
+    for line in lines:
+        line = line.strip()
+        if line:
+            paragraph.append(line)
+            length += len(line) + 1
+        if paragraph and (not line or length >= size):
+            yield " ".join(paragraph)
+            paragraph, length = [], 0
+    if paragraph:
+        yield " ".join(paragraph)
+
+
+# Packs paragraphs into chunks of up to `size` characters, splitting only
+# paragraphs that are longer than that on their own. Yields the chunks.
+def chunk_text(paragraphs, size=CHUNK_CHARS):
+    current = ""
+    for paragraph in paragraphs:
+        paragraph = " ".join(paragraph.split())
+        start = 0
+        while len(paragraph) - start > size:
+            cut = paragraph.rfind(" ", start, start + size)
+            cut = start + size if cut <= start else cut
+            if current:
+                yield current
+                current = ""
+            yield paragraph[start:cut]
+            start = cut + 1 if paragraph[cut:cut + 1] == " " else cut
+        paragraph = paragraph[start:]
+        if not paragraph:
+            continue
+        if current and len(current) + len(paragraph) + 1 > size:
+            yield current
+            current = ""
+        current = f"{current}\n{paragraph}" if current else paragraph
+    if current:
+        yield current
+
+
+# Yields the document's paragraphs; text files are read line by line so a
+# large upload is never decoded in one piece.
+def extract_paragraphs(spool, mime_type):
+    spool.seek(0)
+    if mime_type == "text/plain":
+        text = io.TextIOWrapper(spool, encoding="utf-8", errors="replace")
+        try:
+            yield from _paragraphs(text)
+        finally:
+            text.detach()  # leave the spool open
+    elif mime_type == DOCX_MIME:
+        with zipfile.ZipFile(spool) as docx:
+            root = ElementTree.fromstring(docx.read("word/document.xml"))
+        for p in root.iter(f"{_W_NS}p"):
+            yield "".join(t.text or "" for t in p.iter(f"{_W_NS}t"))
+    elif mime_type == "application/pdf" and pypdf is not None:
+        for page in pypdf.PdfReader(spool).pages:
+            yield from _paragraphs((page.extract_text() or "").splitlines())
+
+
+class AttachmentStore:
+    """Bounded LRU of Attachments by content hash, plus remote file handles.
+
+    Remote handles are per backend (each API key has its own File API
+    namespace) and expire before Gemini deletes uploaded files (48h).
+    """
+
+    def __init__(self, max_entries=16, remote_ttl_seconds=46 * 3600):
+        self.max_entries = max_entries
+        self.remote_ttl_seconds = remote_ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.uploads = 0
+        self._entries = OrderedDict()
+        self._remote = weakref.WeakKeyDictionary()  # backend -> {sha256: (uploaded_at, part)}
+        self._lock = threading.Lock()
+
+    def load(self, uploaded_file):
+        """Hash and spool an upload (anything with .name, .type and .read), once."""
+        if uploaded_file is None or isinstance(uploaded_file, Attachment):
+            return uploaded_file
+        mime_type = uploaded_file.type
+        if mime_type not in SUPPORTED_MIMES:
+            raise AttachmentError(f"Unsupported file type ({uploaded_file.name}). Please upload PDF, Word (.docx), text (.txt), PNG, JPG/JPEG.")
+
+        source = uploaded_file.open() if hasattr(uploaded_file, "open") else uploaded_file
+        if hasattr(source, "seek"):
+            source.seek(0)
+        digest = hashlib.sha256()
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+        size = 0
+        try:
+            while block := source.read(READ_BYTES):
+                size += len(block)
+                if size > MAX_UPLOAD_BYTES:
+                    raise AttachmentError("Uploaded file is too large (over 20MB). Please use a smaller file.")
+                digest.update(block)
+                spool.write(block)
+        except AttachmentError:
+            spool.close()
+            raise
+        finally:
+            if source is not uploaded_file:
+                source.close()
+            elif hasattr(source, "seek"):
+                source.seek(0)
+
+        sha256 = digest.hexdigest()
+        with self._lock:
+            attachment = self._entries.get(sha256)
+            if attachment is not None:
+                self._entries.move_to_end(sha256)
+                self.hits += 1
+                spool.close()
+                return attachment
+            self.misses += 1
+
+        attachment = Attachment(uploaded_file.name, mime_type, sha256, size, spool)
+        try:
+            attachment.add_chunks(chunk_text(extract_paragraphs(spool, mime_type)))
+        except Exception as e:
+            if mime_type != "application/pdf":
+                attachment.close()
+                raise AttachmentError(f"Error processing uploaded file ({uploaded_file.name}): {e}. Try again or skip upload.") from e
+        with self._lock:
+            self._entries[sha256] = attachment
+            # Evicted spools are not closed here: a sweep or a queued service
+            # job may still hold the Attachment. Dropping the store's
+            # reference lets the spool close once the last holder is done.
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                for files in self._remote.values():
+                    files.pop(evicted.sha256, None)
+        return attachment
+
+    def get(self, sha256):
+        """The stored Attachment with this hash, or None once it was evicted."""
+        with self._lock:
+            attachment = self._entries.get(sha256)
+            if attachment is not None:
+                self._entries.move_to_end(sha256)
+            return attachment
+
+    def file_part(self, handle, attachment):
+        """A content part for the file itself: a File API reference when the
+        backend can upload (once per key and file), otherwise inline bytes."""
+        upload = getattr(handle.backend, "upload", None)
+        if upload is None:
+            return {"mime_type": attachment.mime_type, "data": attachment.read()}
+        with self._lock:
+            files = self._remote.setdefault(handle.backend, {})
+            cached = files.get(attachment.sha256)
+            if cached is not None and time.time() - cached[0] < self.remote_ttl_seconds:
+                return cached[1]
+        with attachment.open_copy() as f:
+            part = upload(f, attachment.mime_type, attachment.name)
+        with self._lock:
+            self.uploads += 1
+            files[attachment.sha256] = (time.time(), part)
+        return part
+
+    def clear(self):
+        with self._lock:
+            for attachment in self._entries.values():
+                attachment.close()
+            self._entries.clear()
+            self._remote.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "uploads": self.uploads, "entries": len(self._entries)}
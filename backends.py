@@ -0,0 +1,269 @@
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+import google.generativeai as genai
+from google.ai import generativelanguage as glm
+from google.api_core import exceptions as api_exceptions
+from google.generativeai.client import FileServiceClient
+
+DEFAULT_MODEL = 'gemini-3-flash-preview'  # Higher free quota than 3-flash
+
+generation_config = {
+    "response_mime_type": "application/json"
+}
+
+# A backend is anything with a `model_name` attribute and a
+# `generate_content(content, schema=None, timeout=None)` method returning an
+# object with `.text` and (optionally) `.usage_metadata`, i.e. the subset of
+# GenerativeModel the agents rely on. `schema` is the response schema the
+# reply should follow; past `timeout` seconds the call raises DeadlineExceeded. A backend may also offer `upload(file, mime_type,
+# display_name)` returning a content part that references the file remotely.
+# ModelHandle adds rate limiting and metrics on top.
+
+
+class GeminiBackend:
+    """A Gemini model bound to one API key through its own client."""
+
+    def __init__(self, api_key, model_name=DEFAULT_MODEL):
+        self.client = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+        self.files = FileServiceClient(client_options={"api_key": api_key})
+        self.model = genai.GenerativeModel(model_name, generation_config=generation_config)
+        # GenerativeModel only falls back to the global client when none is set.
+        self.model._client = self.client
+
+    @property
+    def model_name(self):
+        return self.model.model_name
+
+    def generate_content(self, content, schema=None, timeout=None):
+        # RateLimiter is the only retry layer: the client's own retry of 503s
+        # (up to a 600s deadline) would otherwise run underneath it, unseen.
+        options = {"request_options": {"retry": None, **({"timeout": timeout} if timeout else {})}}
+        if schema is None:
+            return self.model.generate_content(content, **options)
+        return self.model.generate_content(content, generation_config={"response_schema": schema}, **options)
+
+    # Uploads through the File API so the file can be referenced by URI
+    # instead of sent inline with every request.
+    def upload(self, file, mime_type, display_name=None):
+        uploaded = self.files.create_file(file, mime_type=mime_type, display_name=display_name)
+        return {"file_data": {"mime_type": mime_type, "file_uri": uploaded.uri}}
+
+    def close(self):
+        self.client.transport.close()
+
+
+# ──────────────────────────────────────────────
+# Latency distributions for FakeBackend: each takes a random.Random and
+# returns seconds.
+def constant(seconds):
+    return lambda rng: seconds
+
+
+def uniform(low, high):
+    return lambda rng: rng.uniform(low, high)
+
+
+def lognormal(median, sigma=0.35):
+    # Long right tail, like real model round-trips.
+    return lambda rng: rng.lognormvariate(math.log(median), sigma)
+
+
+_RISK_TEMPLATES = [
+    ("Vendor delivery slip on power infrastructure", "High", "Single-source vendor with a 20-week lead time on transformers."),
+    ("Fiber backbone capacity shortfall", "Medium", "Projected east-west traffic exceeds provisioned fiber by Q3."),
+    ("Model training run exceeds compute budget", "High", "Scaling laws suggest 30% more accelerator hours than planned."),
+    ("Data pipeline schema drift", "Medium", "Upstream teams change logging formats without versioning."),
+    ("Key engineer attrition", "High", "Two of three staff engineers own critical-path components."),
+    ("Regulatory review of EU AI Act obligations", "Medium", "High-risk classification would add conformity assessments."),
+    ("Serving latency regression at launch", "Medium", "Larger model increases p99 latency beyond SLO."),
+    ("Technical debt in legacy orchestration", "Low", "Deprecated scheduler blocks migration of 40% of jobs."),
+    ("Cooling capacity constraints in summer peak", "Medium", "Ambient temperatures reduce chiller efficiency."),
+    ("Security review backlog", "Low", "Launch review queue is running six weeks behind."),
+]
+
+
+# Real explanations run to a few sentences; pad the canned ones to match so
+# prompt sizes downstream are realistic.
+_EXPLANATION_CONTEXT = (
+    "If unmitigated this lands on the critical path within the next two milestones, "
+    "compounds with adjacent dependencies and forces a re-plan of downstream launch gates; "
+    "early signals are already visible in the latest status reviews."
+)
+
+# The risks in a trade-off prompt.
+_PROMPT_RISK = re.compile(r'"risk":("(?:[^"\\]|\\.)*")')  # compact JSON, not the format example
+
+# Agent prompt marker by the schema's top-level properties.
+_SCHEMA_AGENTS = {
+    "risks": "Risk Forecaster",
+    "tradeoffs": "Trade-Off Optimizer",
+    "email_draft,talking_points,slide_outline": "Comms/Influencer",
+    "concerns,mitigations": "Ethics & Sustainability",
+    "talent_risks,mitigations": "Talent Risk Simulator",
+    "risks,tradeoffs,ethics,talent": "Fast Analyst",
+}
+
+
+class FakeBackend:
+    """Offline stand-in for Gemini that answers every agent with canned,
+    schema-valid JSON. Answers follow the prompt the way a model's would:
+    risk probabilities depend on the prompt (so on the program description
+    and any document excerpt in it), and trade-offs
+    cover the risks they were given.
+
+    latency is a distribution from this module (constant/uniform/lognormal)
+    and token_latency adds seconds per response token, as generation time
+    does. error_rate injects retryable API errors, and malformed_rate returns
+    truncated JSON. A seed makes runs reproducible.
+    """
+
+    def __init__(self, model_name="fake-gemini", latency=None, error_rate=0.0, malformed_rate=0.0,
+                 num_risks=8, options_per_risk=3, seed=0, token_latency=0.0):
+        self.model_name = model_name
+        self.latency = latency or constant(0.0)
+        self.token_latency = token_latency
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.num_risks = num_risks
+        self.options_per_risk = options_per_risk
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self):
+        with self._lock:
+            self.calls += 1
+            return self.latency(self._rng), self._rng.random(), self._rng.random()
+
+    def generate_content(self, content, schema=None, timeout=None):
+        delay, error_roll, malformed_roll = self._draw()
+        if error_roll < self.error_rate:
+            time.sleep(max(0.0, delay))
+            raise api_exceptions.ServiceUnavailable("FakeBackend injected error")
+
+        parts = content if isinstance(content, list) else [content]
+        prompt = "\n".join(p for p in parts if isinstance(p, str))
+        text = json.dumps(self.respond(prompt, schema))
+        delay = max(0.0, delay + self.token_latency * len(text) / 4)
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise api_exceptions.DeadlineExceeded(f"FakeBackend call exceeded {timeout}s")
+        time.sleep(delay)
+        if malformed_roll < self.malformed_rate:
+            text = text[: len(text) // 2]
+        return SimpleNamespace(
+            text=text,
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=len(prompt) // 4,
+                candidates_token_count=len(text) // 4,
+                total_token_count=(len(prompt) + len(text)) // 4,
+            ),
+        )
+
+    def respond(self, prompt, schema=None):
+        if schema is not None and "could not be parsed" in prompt:
+            # A "fix this JSON" request: answer as the agent the schema belongs to.
+            prompt = _SCHEMA_AGENTS.get(",".join(schema.get("properties", {})), prompt)
+        risks = self._risks(prompt=prompt)
+        if "Fast Analyst" in prompt:
+            # As the fused prompt asks: short explanations, two options per risk.
+            risks = self._risks(padded=False, prompt=prompt)
+            return {
+                "risks": risks,
+                "tradeoffs": [self._tradeoff(i, r["risk"], min(2, self.options_per_risk)) for i, r in enumerate(risks)],
+                "ethics": self.respond("Ethics & Sustainability"),
+                "talent": self.respond("Talent Risk Simulator"),
+            }
+        if "Risk Forecaster" in prompt:
+            return {"risks": risks}
+        if "Trade-Off Optimizer" in prompt:
+            # Like a real model, notes sometimes cite risks by their prompt id.
+            names = [json.loads(name) for name in _PROMPT_RISK.findall(prompt)] or [r["risk"] for r in risks]
+            return {"tradeoffs": [self._tradeoff(i, name, cite=len(names)) for i, name in enumerate(names)]}
+        if "Comms/Influencer" in prompt:
+            return {
+                "email_draft": {
+                    "subject": "Program risk update and proposed mitigations",
+                    "greeting": "Hi all,",
+                    "body": "We have identified the top program risks and recommended mitigations. "
+                            "The largest exposure is vendor delivery; we propose dual sourcing.",
+                    "closing": "Thanks, TPM",
+                },
+                "talking_points": [
+                    "Top risk: vendor delivery slip on power infrastructure",
+                    "Dual sourcing for R1 recovers up to 4 weeks",
+                    "Retention plan in place for critical-path engineers",
+                ],
+                "slide_outline": {
+                    "title": "Program Risk Posture",
+                    "bullets": ["Top risks", "Mitigation trade-offs", "Asks for leadership"],
+                },
+            }
+        if "Ethics & Sustainability" in prompt:
+            return {
+                "concerns": [
+                    {"concern": "Carbon footprint of added capacity", "severity": "High", "explanation": "Grid mix is 60% fossil."},
+                    {"concern": "EU AI Act transparency duties", "severity": "Medium", "explanation": "User-facing generation requires disclosure."},
+                ],
+                "mitigations": [
+                    {"mitigation": "Procure renewable PPAs", "benefit": "Cuts operational emissions"},
+                    {"mitigation": "Publish model card", "benefit": "Meets transparency obligations"},
+                ],
+            }
+        if "Talent Risk Simulator" in prompt:
+            return {
+                "talent_risks": [
+                    {"risk": "Staff engineer churn", "probability": "35%", "impact": "High", "explanation": "Critical-path ownership is concentrated."},
+                    {"risk": "ML infra skill gap", "probability": "25%", "impact": "Medium", "explanation": "Few engineers know the new serving stack."},
+                ],
+                "mitigations": [
+                    {"mitigation": "Retention grants for key owners", "benefit": "Reduces churn risk"},
+                    {"mitigation": "Pair onboarding rotations", "benefit": "Spreads system knowledge"},
+                ],
+            }
+        return {}
+
+    def _risks(self, padded=True, prompt=""):
+        shift = int(hashlib.sha256(prompt.encode()).hexdigest()[:8], 16)
+        risks = []
+        for i in range(self.num_risks):
+            name, impact, explanation = _RISK_TEMPLATES[i % len(_RISK_TEMPLATES)]
+            suffix = f" #{i // len(_RISK_TEMPLATES) + 1}" if i >= len(_RISK_TEMPLATES) else ""
+            risks.append({
+                "risk": name + suffix,
+                "probability": f"{20 + (i * 37 + shift) % 70}%",
+                "impact": impact,
+                "explanation": f"{explanation} {_EXPLANATION_CONTEXT}" if padded else explanation,
+            })
+        return risks
+
+    def _tradeoff(self, index, risk, options_per_risk=None, cite=0):
+        note = f"Also reduces R{(index + 1) % cite + 1}" if cite else "Also reduces schedule risk"
+        options = []
+        for j in range(options_per_risk or self.options_per_risk):
+            options.append({
+                "option": f"Mitigation {j + 1} for {risk}",
+                "effort_impact": ["Low", "Medium", "High"][j % 3],
+                "time_impact": f"-{1 + (index + j) % 6} weeks" if j % 2 == 0 else f"+{1 + j} weeks",
+                "cost_impact": f"+${0.2 * (1 + (index + j) % 5):.1f}M" if j % 3 != 2 else "-$0.1M",
+                "quality_risk_reduction": f"{15 + (index * 7 + j * 11) % 60}%",
+                "multi_risk_note": note if j == 0 else "",
+            })
+        return {"risk": risk, "options": options}
+
+
+def make_backend(api_key, model_name=DEFAULT_MODEL):
+    # SHADOW_TPM_BACKEND=fake runs the whole app offline against FakeBackend;
+    # SHADOW_TPM_FAKE_LATENCY is its median seconds per call (0 for none).
+    if os.environ.get("SHADOW_TPM_BACKEND", "gemini").lower() == "fake":
+        median = float(os.environ.get("SHADOW_TPM_FAKE_LATENCY", 0.5))
+        return FakeBackend(model_name=model_name, latency=lognormal(median) if median > 0 else constant(0.0))
+    return GeminiBackend(api_key, model_name)
@@ -0,0 +1,170 @@
+import argparse
+import csv
+import json
+import mimetypes
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from agents import orchestrator
+
+
+class LocalFile:
+    """Minimal stand-in for Streamlit's UploadedFile backed by a path on disk."""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    def open(self):
+        return open(self.path, "rb")
+
+    def read(self):
+        with self.open() as f:
+            return f.read()
+
+
+def load_programs(path):
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    programs = []
+    for index, row in enumerate(rows, start=1):
+        description = row.get("description") or row.get("project_input") or ""
+        programs.append({
+            "id": str(row.get("id") or index),
+            "description": description.strip(),
+            "attachment": (row.get("attachment") or "").strip() or None,
+        })
+    return programs
+
+
+# IDs with a result in the output. Programs whose last attempt failed are
+# run again unless skip_errors is set.
+def completed_ids(path, skip_errors=False):
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a partial line from an interrupted run
+            if skip_errors or "error" not in record:
+                done.add(str(record.get("id")))
+    return done
+
+
+# A run killed mid-write leaves a partial last line; cut it off so the next
+# record starts on a line of its own. That program has no result yet and is
+# run again.
+def truncate_partial_line(path, block=1 << 16):
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - block)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b"\n")
+            if newline >= 0:
+                position = start + newline + 1
+                break
+            position = start
+        if position < end:
+            f.truncate(position)
+
+
+def run_program(program, api_key, max_workers, mode="thorough"):
+    start = time.perf_counter()
+    uploaded_file = LocalFile(program["attachment"]) if program["attachment"] else None
+    try:
+        result = orchestrator(program["description"], uploaded_file, api_key, max_workers, mode=mode)
+    except Exception as e:
+        result = {"error": f"{type(e).__name__}: {e}"}
+    record = {"id": program["id"], "elapsed_s": round(time.perf_counter() - start, 3)}
+    if "error" in result:
+        record["error"] = result["error"]
+    else:
+        record["result"] = result
+    return record
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_batch(input_path, output_path, api_key, concurrency=4, agent_workers=3, skip_errors=False, log=print,
+              mode="thorough"):
+    programs = load_programs(input_path)
+    truncate_partial_line(output_path)
+    done = completed_ids(output_path, skip_errors)
+    todo = [p for p in programs if p["id"] not in done and p["description"]]
+    skipped = "already done, failed or empty" if skip_errors else "already done or empty"
+    log(f"{len(programs)} programs, {len(programs) - len(todo)} skipped ({skipped}), {len(todo)} to run")
+
+    latencies = []
+    failures = 0
+    write_lock = threading.Lock()
+    start = time.perf_counter()
+
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = [pool.submit(run_program, p, api_key, agent_workers, mode) for p in todo]
+        for future in as_completed(futures):
+            record = future.result()
+            with write_lock:
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+            latencies.append(record["elapsed_s"])
+            if "error" in record:
+                failures += 1
+            log(f"[{len(latencies)}/{len(todo)}] {record['id']}: {'error: ' + record['error'] if 'error' in record else 'ok'} ({record['elapsed_s']}s)")
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        "programs": len(todo),
+        "succeeded": len(todo) - failures,
+        "failed": failures,
+        "wall_time_s": round(elapsed, 3),
+        "throughput_per_min": round(len(todo) / elapsed * 60, 2) if elapsed and todo else 0.0,
+        "latency_p50_s": percentile(latencies, 50),
+        "latency_p95_s": percentile(latencies, 95),
+        "latency_max_s": max(latencies, default=0.0),
+    }
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run Shadow TPM simulations over a JSONL or CSV file of program descriptions.")
+    parser.add_argument("input", help="JSONL or CSV with id, description and optional attachment (file path) fields")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="JSONL file results are appended to (default: results.jsonl)")
+    parser.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY") or os.environ.get("GOOGLE_API_KEY", ""), help="Gemini API key (default: $GEMINI_API_KEY or $GOOGLE_API_KEY)")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="programs simulated at once (default: 4)")
+    parser.add_argument("--agent-workers", type=int, default=3, help="agents run in parallel within one program (default: 3)")
+    parser.add_argument("--skip-errors", action="store_true", help="don't rerun IDs whose previous attempt failed (by default they are retried)")
+    parser.add_argument("--mode", choices=("thorough", "fast"), default="thorough", help="fast fuses the analysis into one call for quick triage (default: thorough)")
+    args = parser.parse_args(argv)
+
+    if not args.api_key.strip():
+        parser.error("No Gemini API key provided. Pass --api-key or set GEMINI_API_KEY.")
+
+    summary = run_batch(args.input, args.output, args.api_key, args.concurrency, args.agent_workers, args.skip_errors,
+                        log=lambda msg: print(msg, file=sys.stderr), mode=args.mode)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import plotly
+
+import dashboard
+import normalize
+from agents import orchestrator
+from backends import FakeBackend, lognormal
+from batch import LocalFile
+from clients import ModelHandle
+from compaction import project_risks, project_tradeoffs
+from ratelimit import RateLimiter
+from routing import DEFAULT_ROUTES, Router
+from scenarios import run_sweep
+from schemas import AGENT_SCHEMAS, conform
+
+# Offline benchmarks for the orchestrator and dashboard, run against
+# FakeBackend so no key or network is needed. Every random draw is seeded,
+# so two runs on the same machine are directly comparable:
+#
+#   python benchmark.py -o bench.json
+#   python benchmark.py --baseline bench.json   # after a change
+
+_unique = itertools.count()
+
+
+def fake_handle(median_latency=0.05, error_rate=0.0, malformed_rate=0.0, seed=0, **backend_options):
+    backend = FakeBackend(latency=lognormal(median_latency) if median_latency else None,
+                          error_rate=error_rate, malformed_rate=malformed_rate, seed=seed, **backend_options)
+    # Quota limits and cache hits are not what is being measured; keep
+    # retries fast and send every call to the backend.
+    return ModelHandle(backend, RateLimiter(rpm=1e9, tpm=1e12, base_delay=0.01)).bind(use_cache=False)
+
+
+def _program(label):
+    return f"Benchmark program {label}-{next(_unique)}: scale a 1GW TPU cluster, 9-month deadline, $500M budget."
+
+
+def _stats(samples):
+    ordered = sorted(samples)
+    return {
+        "runs": len(ordered),
+        "mean_s": round(statistics.fmean(ordered), 4),
+        "p50_s": round(ordered[len(ordered) // 2], 4),
+        "p95_s": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 4),
+        "max_s": round(ordered[-1], 4),
+    }
+
+
+def bench_latency(runs, median_latency, max_workers, seed=0):
+    handle = fake_handle(median_latency, seed=seed)
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = orchestrator(_program("latency"), handle=handle, max_workers=max_workers)
+        samples.append(time.perf_counter() - start)
+        assert "error" not in result, result
+    return _stats(samples)
+
+
+def bench_throughput(simulations, concurrency, median_latency, seed=0):
+    handle = fake_handle(median_latency, seed=seed)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: orchestrator(_program("throughput"), handle=handle), range(simulations)))
+    elapsed = time.perf_counter() - start
+    return {
+        "simulations": simulations,
+        "concurrency": concurrency,
+        "wall_s": round(elapsed, 4),
+        "simulations_per_s": round(simulations / elapsed, 3),
+        "errors": sum(1 for r in results if "error" in r),
+    }
+
+
+def bench_faults(runs, error_rate, malformed_rate, seed=0):
+    handle = fake_handle(0.0, error_rate=error_rate, malformed_rate=malformed_rate, seed=seed)
+    results = [orchestrator(_program("faults"), handle=handle) for _ in range(runs)]
+    completed = [r for r in results if "error" not in r]
+    retries = sum(call["retries"] for r in completed for call in r["metrics"]["calls"])
+    return {
+        "runs": runs,
+        "error_rate": error_rate,
+        "malformed_rate": malformed_rate,
+        "completed": len(completed),
+        "success_rate": round(len(completed) / runs, 3),
+        "retries": retries,
+        "model_calls": handle.backend.calls,
+    }
+
+
+def completeness(result):
+    # Share of the fields the dashboard renders that are actually filled in.
+    risks = result.get("risks") or []
+    covered = {t.get("risk") for t in result.get("tradeoffs") or [] if t.get("options")}
+    comms = result.get("comms") or {}
+    ethics = result.get("ethics") or {}
+    talent = result.get("talent") or {}
+    checks = [
+        bool(risks),
+        all(r.get(f) for r in risks for f in ("risk", "probability", "impact", "explanation")),
+        bool(risks) and all(r.get("risk") in covered for r in risks),
+        bool(comms.get("email_draft", {}).get("body")),
+        bool(comms.get("talking_points")),
+        bool(ethics.get("concerns")),
+        bool(ethics.get("mitigations")),
+        bool(talent.get("talent_risks")),
+        bool(talent.get("mitigations")),
+    ]
+    return sum(checks) / len(checks)
+
+
+def bench_modes(runs, median_latency, token_latency, seed=0):
+    # Fast vs thorough. token_latency makes long replies slower, so the fused
+    # call is not credited with free output.
+    report = {}
+    for mode in ("thorough", "fast"):
+        handle = fake_handle(median_latency, seed=seed, token_latency=token_latency)
+        samples, prompt_tokens, response_tokens, scores = [], 0, 0, []
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = orchestrator(_program(mode), handle=handle, mode=mode)
+            samples.append(time.perf_counter() - start)
+            assert "error" not in result, result
+            prompt_tokens += sum(c["prompt_tokens"] for c in result["metrics"]["calls"])
+            response_tokens += sum(c["response_tokens"] for c in result["metrics"]["calls"])
+            scores.append(completeness(result))
+        report[mode] = {
+            **_stats(samples),
+            "model_calls_per_run": round(handle.backend.calls / runs, 2),
+            "prompt_tokens_per_run": round(prompt_tokens / runs),
+            "response_tokens_per_run": round(response_tokens / runs),
+            "completeness": round(statistics.fmean(scores), 3),
+        }
+    return report
+
+
+def bench_routing(runs, seed=0):
+    # The strong model is occasionally very slow (long tail); with routing,
+    # calls over the 0.15s budget move to a faster tier. A single model has
+    # nothing to fall back to, so it runs without a budget and waits out the tail.
+    def factory(model_name):
+        median = {"strong": 0.08, "standard": 0.04, "fast": 0.02}[model_name]
+        return FakeBackend(model_name=model_name, latency=lognormal(median, sigma=0.9), seed=seed)
+
+    report = {}
+    for label, tiers, budget in (("single_model", {"strong": "strong", "standard": "strong", "fast": "strong"}, None),
+                                 ("routed", {"strong": "strong", "standard": "standard", "fast": "fast"}, 0.15)):
+        routes = {agent: {"latency_budget_s": budget} for agent in DEFAULT_ROUTES}
+        router = Router(tiers, routes)
+        handle = ModelHandle(factory("strong"), router=router, backend_factory=factory,
+                             limiter_factory=lambda: RateLimiter(rpm=1e9, tpm=1e12, base_delay=0.01)).bind(use_cache=False)
+        samples, calls = [], []
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = orchestrator(_program("routing"), handle=handle)
+            assert "error" not in result, result
+            samples.append(time.perf_counter() - start)
+            calls.extend(result["metrics"]["calls"])
+        report[label] = {
+            **_stats(samples),
+            "fallbacks": sum(len(c.get("fallbacks", [])) for c in calls),
+            "calls_by_model": {m: sum(1 for c in calls if c["model"] == m) for m in sorted({c["model"] for c in calls})},
+        }
+    return report
+
+
+def bench_compaction(num_risks, options_per_risk):
+    # Token savings per agent, plus a check that what compaction keeps is
+    # still enough: every projected risk/option retains the fields the
+    # downstream prompts reference, and every agent's output still conforms
+    # to its schema.
+    handle = fake_handle(0.0, num_risks=num_risks, options_per_risk=options_per_risk)
+    result = orchestrator(_program("compaction"), handle=handle)
+    risks_data = {"risks": result["risks"]}
+    tradeoffs_data = {"tradeoffs": result["tradeoffs"]}
+    risk_fields = {"id", "risk", "probability", "impact"}
+    option_fields = {"option", "time_impact", "quality_risk_reduction"}
+    projected_ok = all(
+        risk_fields <= set(r) for agent in ("trade_off_optimizer", "ethics_checker", "talent_risk_simulator", "comms_influencer")
+        for r in project_risks(risks_data, agent)
+    ) and all(option_fields <= set(o) for t in project_tradeoffs(tradeoffs_data, risks_data) for o in t["options"])
+    sections = {
+        "risk_forecaster": risks_data,
+        "trade_off_optimizer": tradeoffs_data,
+        "comms_influencer": result["comms"],
+        "ethics_checker": result["ethics"],
+        "talent_risk_simulator": result["talent"],
+    }
+    outputs_ok = all(not conform(json.loads(json.dumps(sections[a])), AGENT_SCHEMAS[a])[1] for a in sections)
+    return {
+        "risks": num_risks,
+        "agents": result["metrics"]["compaction"],
+        "projected_fields_present": projected_ok,
+        "outputs_conform": outputs_ok,
+    }
+
+
+def bench_sweep(median_latency, seed=0):
+    # A 2x2 what-if sweep vs running the four variants one after another.
+    variations = {"deadline": ["9-month", "12-month"], "budget": ["$500M", "$350M"]}
+    serial = fake_handle(median_latency, seed=seed).bind(use_cache=True)
+    base = _program("sweep")
+    start = time.perf_counter()
+    for deadline, budget in itertools.product(*variations.values()):
+        orchestrator(f"{base} deadline: {deadline}; budget: {budget}", handle=serial)
+    serial_s = time.perf_counter() - start
+    swept = fake_handle(median_latency, seed=seed).bind(use_cache=True)
+    sweep = run_sweep(_program("sweep"), variations, handle=swept)
+    return {
+        "scenarios": len(sweep["scenarios"]),
+        "serial_wall_s": round(serial_s, 4),
+        "sweep_wall_s": sweep["wall_s"],
+        "stages_reused": sweep["stages_reused"],
+        "model_calls": swept.backend.calls,
+    }
+
+
+def bench_upload_memory(size_mb):
+    with tempfile.NamedTemporaryFile(suffix=".txt", delete=False) as f:
+        chunk = b"Milestone: vendor delivery week 12; dependency: fiber backbone.\n" * 1024
+        remaining = int(size_mb * 1024 * 1024)
+        while remaining > 0:
+            f.write(chunk[:remaining])
+            remaining -= len(chunk)
+        path = f.name
+    try:
+        handle = fake_handle(0.0)
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = orchestrator(_program("upload"), LocalFile(path), handle=handle)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        os.remove(path)
+    return {
+        "upload_mb": size_mb,
+        "peak_mb": round(peak / 1024 / 1024, 2),
+        "peak_to_upload": round(peak / (size_mb * 1024 * 1024), 2),
+        "wall_s": round(elapsed, 4),
+        "payload_mb": round(sum(c["payload_bytes"] for c in result.get("metrics", {}).get("calls", [])) / 1024 / 1024, 3),
+        "ok": "error" not in result,
+    }
+
+
+def _best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 3)
+
+
+def bench_render(num_risks, options_per_risk, repeat=3):
+    # Parsing happens once per section (normalize.py); everything after it
+    # is vectorized over the typed columns.
+    backend = FakeBackend(num_risks=num_risks, options_per_risk=options_per_risk)
+    risks = backend.respond("Risk Forecaster")["risks"]
+    tradeoffs = backend.respond("Trade-Off Optimizer")["tradeoffs"]
+    result = orchestrator(_program("render"), handle=fake_handle(0.0))
+    df_prob = normalize.risk_frame(risks)
+    df_options = normalize.option_frame(tradeoffs)
+    parsed = int(df_options[["time_weeks", "cost_musd", "risk_reduction_pct"]].notna().all(axis=1).sum())
+    assert parsed == len(df_options), f"{len(df_options) - parsed} options with unparsed impacts"
+    return {
+        "risks": num_risks,
+        "options": num_risks * options_per_risk,
+        "risk_frame_ms": _best_of(lambda: normalize.risk_frame(risks), repeat),
+        "option_frame_ms": _best_of(lambda: normalize.option_frame(tradeoffs), repeat),
+        "probability_figure_ms": _best_of(lambda: dashboard.probability_figure(df_prob), repeat),
+        "heatmap_figure_ms": _best_of(lambda: dashboard.heatmap_figure(df_prob), repeat),
+        "impact_pie_figure_ms": _best_of(lambda: dashboard.impact_pie_figure(df_prob), repeat),
+        "impact_summary_ms": _best_of(lambda: normalize.impact_summary(df_options), repeat),
+        "waterfall_figure_ms": _best_of(lambda: dashboard.waterfall_figure(result["metrics"]), repeat),
+    }
+
+
+def run_suite(quick=False, seed=0):
+    runs = 5 if quick else 20
+    latency = 0.05
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pandas": pd.__version__,
+            "plotly": plotly.__version__,
+            "seed": seed,
+            "fake_median_latency_s": latency,
+        },
+        "latency": {
+            "serial": bench_latency(runs, latency, max_workers=1, seed=seed),
+            "parallel": bench_latency(runs, latency, max_workers=3, seed=seed),
+        },
+        "throughput": {
+            f"concurrency_{n}": bench_throughput(runs, n, latency, seed=seed) for n in (1, 4, 16)
+        },
+        "faults": bench_faults(runs, error_rate=0.1, malformed_rate=0.05, seed=seed),
+        "modes": bench_modes(runs, latency, token_latency=0.0002, seed=seed),
+        "routing": bench_routing(runs, seed=seed),
+        "compaction": bench_compaction(10, 4),
+        "sweep": bench_sweep(latency, seed=seed),
+        "upload_memory": bench_upload_memory(5 if quick else 19.5),
+        "render": {
+            "small": bench_render(10, 4),
+            "large": bench_render(250 if quick else 1000, 4),
+        },
+    }
+    return report
+
+
+def _numbers(tree, prefix=""):
+    for key, value in tree.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _numbers(value, path + ".")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield path, value
+
+
+def compare(report, baseline):
+    old = dict(_numbers({k: v for k, v in baseline.items() if k != "environment"}))
+    lines = []
+    for path, new in _numbers({k: v for k, v in report.items() if k != "environment"}):
+        if path not in old:
+            continue
+        before = old[path]
+        change = f"{(new - before) / before * 100:+.1f}%" if before else "n/a"
+        lines.append(f"{path:<48} {before:>12} {new:>12} {change:>9}")
+    return "\n".join([f"{'metric':<48} {'baseline':>12} {'current':>12} {'change':>9}"] + lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline Shadow TPM benchmarks against a fake Gemini backend.")
+    parser.add_argument("-o", "--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="JSON report from an earlier run to compare against")
+    parser.add_argument("--quick", action="store_true", help="fewer runs and smaller inputs")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    report = run_suite(args.quick, args.seed)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            print(compare(report, json.load(f)))
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import contextlib
+import copy
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+
+from backends import make_backend
+from ratelimit import RateLimiter
+from routing import Router
+
+
+class ModelHandle:
+    """A model backend bound to one API key, plus that key's RateLimiter.
+
+    Unlike genai.configure, the key lives on the backend's own client, so
+    handles for different users can be used from different threads at once.
+    With a router and a backend_factory, agents are sent to other models as
+    routed; those backends are created on first use, each with its own
+    RateLimiter since Gemini quotas are per model.
+    """
+
+    def __init__(self, backend, limiter=None, router=None, backend_factory=None, limiter_factory=RateLimiter):
+        self.backend = backend
+        self.limiter = limiter or limiter_factory()
+        self.limiter_factory = limiter_factory
+        self.router = router
+        self.backend_factory = backend_factory
+        self.metrics = None
+        self.fallbacks = None  # a list to collect the fallbacks calls take, if set
+        self.use_cache = True  # False always calls the model (fresh replies still refill the cache)
+        self._models = {}
+        self._lock = threading.Lock()
+
+    @property
+    def model_name(self):
+        return self.backend.model_name
+
+    def route(self, agent):
+        """[(model_name, latency_budget_s)] for the agent, in fallback order."""
+        if self.router is None or self.backend_factory is None:
+            return [(self.model_name, None)]
+        return self.router.candidates(agent)
+
+    def latency_budget(self, agent):
+        return self.router.budget(agent) if self.router is not None and self.backend_factory is not None else None
+
+    def model(self, model_name=None):
+        """(backend, limiter) for model_name, created on first use."""
+        if model_name is None or self.backend_factory is None or model_name in (self.model_name, self.model_name.removeprefix("models/")):
+            return self.backend, self.limiter
+        with self._lock:
+            if model_name not in self._models:
+                self._models[model_name] = (self.backend_factory(model_name), self.limiter_factory())
+            return self._models[model_name]
+
+    def generate_content(self, content, schema=None, model_name=None, timeout=None):
+        backend, _ = self.model(model_name)
+        if timeout is None:
+            return backend.generate_content(content, schema)
+        return backend.generate_content(content, schema, timeout=timeout)
+
+    # A per-run view sharing this handle's backend and limiter, e.g.
+    # handle.bind(metrics=RunMetrics()) to collect timings for one simulation.
+    def bind(self, **overrides):
+        view = copy.copy(self)
+        view.__dict__.update(overrides)
+        return view
+
+    def close(self):
+        for backend in [self.backend, *(b for b, _ in self._models.values())]:
+            close = getattr(backend, "close", None)
+            if close is not None:
+                close()
+
+
+def handle_for_key(api_key):
+    router = Router.from_env()
+    return ModelHandle(make_backend(api_key, router.tiers["strong"]), router=router,
+                       backend_factory=lambda model_name: make_backend(api_key, model_name))
+
+
+class ClientPool:
+    """Bounded, thread-safe pool of ModelHandles keyed by API key.
+
+    Repeated runs with the same key reuse one client and its connections. Past
+    max_size keys the least recently used handle is dropped from the pool and
+    closed, once no simulation is still leasing it.
+    """
+
+    def __init__(self, max_size=32, factory=handle_for_key):
+        self.max_size = max_size
+        self.factory = factory
+        self._handles = OrderedDict()
+        self._leases = Counter()  # handle -> simulations using it
+        self._retired = set()  # evicted, closed when their last lease ends
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def lease(self, api_key):
+        """The key's handle, kept open until the block exits."""
+        slot = hashlib.sha256(api_key.encode()).hexdigest()
+        with self._lock:
+            handle = self._handles.get(slot)
+            if handle is None:
+                handle = self.factory(api_key)
+                self._handles[slot] = handle
+            self._handles.move_to_end(slot)
+            self._leases[handle] += 1
+            idle = []
+            while len(self._handles) > self.max_size:
+                _, evicted = self._handles.popitem(last=False)
+                if self._leases[evicted]:
+                    self._retired.add(evicted)
+                else:
+                    idle.append(evicted)
+        # Closing shuts down gRPC channels; don't hold up other keys meanwhile.
+        for evicted in idle:
+            evicted.close()
+        try:
+            yield handle
+        finally:
+            with self._lock:
+                self._leases[handle] -= 1
+                retire = not self._leases[handle] and handle in self._retired
+                if not self._leases[handle]:
+                    del self._leases[handle]
+                    self._retired.discard(handle)
+            if retire:
+                handle.close()
+
+    def __len__(self):
+        return len(self._handles)
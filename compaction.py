@@ -0,0 +1,112 @@
+import json
+import re
+
+from ratelimit import estimate_tokens
+
+# Per-agent projections of upstream results. Downstream agents only need a
+# few fields of each risk and trade-off, so instead of json.dumps of the
+# whole structure they get stable short IDs, the fields they use, explanations
+# cut to a sentence or two and JSON without whitespace. The IDs are internal:
+# expand_risk_ids puts the risk text back wherever a model still wrote one.
+
+EXPLANATION_CHARS = {
+    "trade_off_optimizer": 160,
+    "ethics_checker": 120,
+    "talent_risk_simulator": 100,
+    "comms_influencer": 0,
+}
+OPTIONS_PER_RISK_FOR_COMMS = 2
+
+_RISK_ID = re.compile(r"\bR(\d+)\b")
+
+
+def dumps(data):
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def _truncate(text, limit):
+    text = " ".join(str(text).split())
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0] + "…"
+
+
+def _percent(value):
+    try:
+        return float(str(value).strip().rstrip("%"))
+    except ValueError:
+        return 0.0
+
+
+def risk_ids(risks_data):
+    return {r.get("risk", ""): f"R{i}" for i, r in enumerate(risks_data.get("risks", []), start=1)}
+
+
+def project_risks(risks_data, agent):
+    limit = EXPLANATION_CHARS.get(agent, 120)
+    projected = []
+    for i, risk in enumerate(risks_data.get("risks", []), start=1):
+        item = {
+            "id": f"R{i}",
+            "risk": risk.get("risk", ""),
+            "probability": risk.get("probability", ""),
+            "impact": risk.get("impact", ""),
+        }
+        if limit and risk.get("explanation"):
+            item["explanation"] = _truncate(risk["explanation"], limit)
+        projected.append(item)
+    return projected
+
+
+def project_tradeoffs(tradeoffs_data, risks_data, options_per_risk=OPTIONS_PER_RISK_FOR_COMMS):
+    # Comms only needs the strongest mitigations, referenced by risk ID.
+    ids = risk_ids(risks_data)
+    projected = []
+    for item in tradeoffs_data.get("tradeoffs", []):
+        options = sorted(item.get("options", []), key=lambda o: _percent(o.get("quality_risk_reduction")), reverse=True)
+        projected.append({
+            "risk_id": ids.get(item.get("risk", ""), item.get("risk", "")),
+            "options": [
+                {
+                    "option": o.get("option", ""),
+                    "time_impact": o.get("time_impact", ""),
+                    "quality_risk_reduction": o.get("quality_risk_reduction", ""),
+                }
+                for o in options[:options_per_risk]
+            ],
+        })
+    return projected
+
+
+def expand_risk_ids(data, risks_data):
+    """`data` with every risk ID ("R2") in its text replaced by that risk's
+    text, quoted inside longer text; IDs that name no risk are left alone."""
+    names = [r.get("risk", "") for r in risks_data.get("risks", [])]
+
+    def name(match):
+        i = int(match.group(1))
+        return f"\"{names[i - 1]}\"" if 1 <= i <= len(names) else match.group()
+
+    def expand(value):
+        if isinstance(value, str):
+            whole = _RISK_ID.fullmatch(value.strip())
+            if whole and 1 <= int(whole.group(1)) <= len(names):
+                return names[int(whole.group(1)) - 1]
+            return _RISK_ID.sub(name, value)
+        if isinstance(value, list):
+            return [expand(v) for v in value]
+        if isinstance(value, dict):
+            return {k: expand(v) for k, v in value.items()}
+        return value
+
+    return expand(data)
+
+
+def savings(full, compact):
+    full_tokens = estimate_tokens(full)
+    compact_tokens = estimate_tokens(compact)
+    return {
+        "full_tokens": full_tokens,
+        "compact_tokens": compact_tokens,
+        "saved_pct": round((1 - compact_tokens / full_tokens) * 100, 1) if full_tokens else 0.0,
+    }
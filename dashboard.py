@@ -0,0 +1,290 @@
+import difflib
+import time
+
+import pandas as pd
+import plotly.express as px
+
+from normalize import impact_summary_by, normalize_result, option_frame, risk_frame
+
+# Pure DataFrame/figure builders behind the app.py dashboard. They take the
+# orchestrator's output sections, or the typed frames normalize.py parses
+# them into, and never touch Streamlit, so they can be cached and benchmarked
+# on their own.
+
+IMPACT_COLORS = {
+    'High': '#E74C3C',   # Rich red
+    'Medium': '#F39C12', # Amber
+    'Low': '#2ECC71'     # Green
+}
+
+
+def probability_figure(df_prob):
+    # Risk Probability Bar Chart (aesthetics improved)
+    fig_prob = px.bar(
+        df_prob,
+        x='risk',
+        y='probability_pct',
+        color='impact',
+        title="Risk Probabilities (%) by Impact",
+        labels={'probability_pct': 'Probability (%)', 'risk': 'Risk'},
+        height=500,
+        color_discrete_map=IMPACT_COLORS,
+        text='probability_pct'
+    )
+    fig_prob.update_traces(hovertemplate='<b>%{x}</b><br>Probability: %{y}%', texttemplate='%{text:.1f}%', textposition='outside')
+    fig_prob.update_layout(
+        xaxis_tickangle=-45,
+        xaxis_title="",
+        yaxis_title="Probability (%)",
+        font=dict(family="Arial, sans-serif", size=13),
+        uniformtext_minsize=12,
+        uniformtext_mode='hide',
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        margin=dict(b=120),
+        showlegend=True
+    )
+    return fig_prob
+
+
+def heatmap_figure(df_prob):
+    # Risk Heatmap (aesthetics improved)
+    df_pivot = df_prob.pivot_table(
+        index='risk',
+        columns='impact',
+        values='probability_pct',
+        aggfunc='first'
+    ).fillna(0)
+
+    fig_heat = px.imshow(
+        df_pivot,
+        title="Risk Heatmap (Probability by Impact)",
+        color_continuous_scale=px.colors.sequential.Reds,
+        height=450,
+        labels=dict(x="Impact Level", y="Risk", color="Probability (%)"),
+        text_auto=True,
+        aspect="auto"
+    )
+    fig_heat.update_layout(
+        xaxis_title="Impact Level",
+        yaxis_title="Risk",
+        xaxis_tickangle=-30,
+        font=dict(family="Arial, sans-serif", size=12),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        coloraxis_colorbar_title="Probability (%)",
+    )
+    return fig_heat
+
+
+def impact_pie_figure(df_risks):
+    # Impact Pie Chart (aesthetics improved)
+    impact_counts = df_risks['impact'].value_counts()
+    # Ensure the categories are in the correct order
+    impact_order = ["High", "Medium", "Low"]
+    impact_counts = impact_counts.reindex(impact_order, fill_value=0)
+
+    fig_pie = px.pie(
+        values=impact_counts.values,
+        names=impact_counts.index,
+        title="Risk Impact Distribution",
+        hole=0.4,
+        color_discrete_map=IMPACT_COLORS,
+        height=420
+    )
+    fig_pie.update_traces(textposition='inside', textinfo='percent+label', pull=[0.05,0.02,0.02])
+    fig_pie.update_layout(font=dict(family="Arial, sans-serif", size=13), legend_title_text="Impact Level")
+    return fig_pie
+
+
+def waterfall_figure(metrics):
+    df_calls = pd.DataFrame(metrics.get("calls", []))
+    models = df_calls["model"] if "model" in df_calls else "Model call"
+    df_calls["source"] = df_calls["cache_hit"].map({True: "Cache hit", False: None}).fillna(models)
+    fig_waterfall = px.bar(
+        df_calls,
+        x="wall_s",
+        y="agent",
+        base="start_s",
+        orientation="h",
+        color="source",
+        title=f"Timing Waterfall (total {metrics.get('total_wall_s', 0):.2f}s)",
+        labels={"wall_s": "Seconds", "agent": "Agent"},
+        color_discrete_map={"Model call": "#3498DB", "Cache hit": "#95A5A6"},
+        hover_data=[c for c in ("retries", "fallbacks") if c in df_calls],
+        height=350
+    )
+    fig_waterfall.update_yaxes(autorange="reversed")
+    fig_waterfall.update_layout(
+        xaxis_title="Seconds since simulation start",
+        yaxis_title="",
+        font=dict(family="Arial, sans-serif", size=12),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+    )
+    return fig_waterfall
+
+
+# ──────────────────────────────────────────────
+# Scenario sweep comparison. `scenarios` is run_sweep()["scenarios"]; the
+# first one is the baseline. Risk wording differs from run to run, so each
+# scenario's risks are matched to the baseline's by text similarity, and
+# risks with no close match are listed under their own name.
+
+def _match_risk(risk, known, cutoff=0.6):
+    matches = difflib.get_close_matches(risk.lower(), [k.lower() for k in known], n=1, cutoff=cutoff)
+    if not matches:
+        return risk
+    return next(k for k in known if k.lower() == matches[0])
+
+
+def scenario_frames(scenarios):
+    """(risks, options) normalized frames of every finished scenario, with a "scenario" column."""
+    risks, options = [], []
+    for scenario in scenarios:
+        if "error" in scenario["result"]:
+            continue
+        frames = normalize_result(scenario["result"])
+        risks.append(frames["risks"].assign(scenario=scenario["label"]))
+        options.append(frames["options"].assign(scenario=scenario["label"]))
+    risks = risks or [risk_frame([]).assign(scenario=pd.Series(dtype=object))]
+    options = options or [option_frame([]).assign(scenario=pd.Series(dtype=object))]
+    return pd.concat(risks, ignore_index=True), pd.concat(options, ignore_index=True)
+
+
+def scenario_probability_frame(df_risks):
+    columns = {}
+    known = []
+    exact = {}  # lowercased name -> known name, so repeated wording skips difflib
+    for label, risk, probability in zip(df_risks["scenario"], df_risks["risk"], df_risks["probability_pct"]):
+        if pd.isna(probability):
+            continue
+        risk = str(risk)
+        name = exact.get(risk.lower()) or _match_risk(risk, known)
+        if name not in known:
+            known.append(name)
+        exact.setdefault(risk.lower(), name)
+        columns.setdefault(label, {}).setdefault(name, probability)
+    return pd.DataFrame(columns, index=known)
+
+
+def scenario_delta_frame(df_matrix):
+    # Percentage-point change from the baseline (first) column.
+    if df_matrix.empty:
+        return df_matrix
+    return df_matrix.sub(df_matrix.iloc[:, 0], axis=0)
+
+
+def scenario_delta_figure(df_delta):
+    fig_delta = px.imshow(
+        df_delta,
+        title="Risk Probability Change vs Baseline (percentage points)",
+        color_continuous_scale="RdYlGn_r",
+        color_continuous_midpoint=0,
+        height=max(350, 40 * len(df_delta)),
+        labels=dict(x="Scenario", y="Risk", color="Δ pp"),
+        text_auto=".0f",
+        aspect="auto"
+    )
+    fig_delta.update_layout(
+        xaxis_title="",
+        yaxis_title="",
+        font=dict(family="Arial, sans-serif", size=12),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+    )
+    return fig_delta
+
+
+def scenario_impact_mix_frame(df_risks, labels):
+    return (pd.crosstab(df_risks["scenario"], df_risks["impact"])
+            .reindex(index=labels, columns=["High", "Medium", "Low"], fill_value=0)
+            .fillna(0).astype(int))
+
+
+def scenario_impact_mix_figure(df_mix):
+    fig_mix = px.bar(
+        df_mix,
+        barmode="stack",
+        title="Risk Impact Mix by Scenario",
+        labels={"index": "Scenario", "value": "Risks", "variable": "Impact"},
+        color_discrete_map=IMPACT_COLORS,
+        height=400
+    )
+    fig_mix.update_layout(
+        xaxis_title="",
+        font=dict(family="Arial, sans-serif", size=12),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        legend_title_text="Impact Level",
+    )
+    return fig_mix
+
+
+def scenario_summary_frame(scenarios, df_risks, df_options):
+    labels = [s["label"] for s in scenarios]
+    probabilities = df_risks.groupby("scenario", sort=False)["probability_pct"]
+    df_summary = pd.DataFrame({
+        "risks": probabilities.size(),
+        "mean_probability": probabilities.mean().astype(float).round(1),
+    }).join(impact_summary_by(df_options, "scenario").rename(columns={
+        "max_delay_reduction": "max_delay_reduction_weeks",
+        "min_cost_impact": "min_cost_impact_musd",
+        "max_risk_reduction": "max_risk_reduction_pct",
+    }), how="left").reindex(labels)
+    errors = {s["label"]: s["result"]["error"] for s in scenarios if "error" in s["result"]}
+    df_summary["risks"] = df_summary["risks"].fillna(0).astype("Int64").mask(df_summary.index.isin(list(errors)))
+    if errors:
+        df_summary["error"] = pd.Series(errors)
+    return df_summary
+
+
+# ──────────────────────────────────────────────
+# Trend of one program across past runs. `trend` is HistoryStore.trend();
+# risks are matched across runs by text similarity like the scenario view.
+
+def _run_label(run):
+    return f"#{run['id']} {time.strftime('%Y-%m-%d %H:%M', time.localtime(run['created']))}"
+
+
+def history_trend_frame(trend):
+    labels = {run["id"]: _run_label(run) for run in trend["runs"]}
+    columns = {label: {} for label in labels.values()}
+    known = []
+    for row in trend["risks"]:
+        if row["probability"] is None:
+            continue
+        name = _match_risk(row["risk"] or "", known)
+        if name not in known:
+            known.append(name)
+        columns[labels[row["run_id"]]].setdefault(name, row["probability"])
+    return pd.DataFrame(columns, index=known)
+
+
+def history_profile_frame(trend):
+    df_runs = pd.DataFrame(trend["runs"], columns=["id", "created", "label", "mode", "risks", "mean_probability",
+                                                   "High", "Medium", "Low"])
+    df_runs.index = [_run_label(run) for run in trend["runs"]]
+    df_runs["mean_probability"] = df_runs["mean_probability"].astype(float).round(1)
+    return df_runs[["label", "mode", "risks", "mean_probability", "High", "Medium", "Low"]]
+
+
+def history_trend_figure(df_trend):
+    df_long = df_trend.rename_axis("risk").reset_index().melt(id_vars="risk", var_name="run", value_name="probability")
+    fig_trend = px.line(
+        df_long.dropna(),
+        x="run",
+        y="probability",
+        color="risk",
+        markers=True,
+        title="Risk Probability Across Runs (%)",
+        labels={"run": "Run", "probability": "Probability (%)", "risk": "Risk"},
+        height=450
+    )
+    fig_trend.update_layout(
+        xaxis_title="",
+        font=dict(family="Arial, sans-serif", size=12),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+    )
+    return fig_trend
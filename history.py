@@ -0,0 +1,352 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from normalize import parse_probability
+
+# Finished simulations kept in a local SQLite file, one row per run plus
+# normalized tables per section, so past runs can be searched by risk text,
+# impact and probability and reloaded without calling the model again.
+# Runs of the same program share a fingerprint (the description with case
+# and whitespace normalized), which is what the trend view groups on.
+
+DEFAULT_DB = os.path.join(os.path.expanduser("~"), ".shadow_tpm", "history.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    created REAL NOT NULL,
+    label TEXT,
+    project_input TEXT NOT NULL,
+    mode TEXT,
+    summary TEXT,
+    sections TEXT NOT NULL,
+    metrics TEXT,
+    attachment TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_fingerprint ON runs (fingerprint, created);
+CREATE INDEX IF NOT EXISTS runs_created ON runs (created);
+
+CREATE TABLE IF NOT EXISTS risks (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    risk TEXT COLLATE NOCASE,
+    probability TEXT,
+    probability_pct REAL,
+    impact TEXT,
+    explanation TEXT,
+    extra TEXT,
+    PRIMARY KEY (run_id, position)
+);
+-- Risk text is matched with LIKE '%...%', which no index can serve.
+DROP INDEX IF EXISTS risks_risk;
+CREATE INDEX IF NOT EXISTS risks_impact ON risks (impact, probability_pct);
+CREATE INDEX IF NOT EXISTS risks_probability ON risks (probability_pct);
+
+CREATE TABLE IF NOT EXISTS tradeoffs (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    risk TEXT COLLATE NOCASE,
+    extra TEXT,
+    PRIMARY KEY (run_id, position)
+);
+
+CREATE TABLE IF NOT EXISTS tradeoff_options (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    tradeoff INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    option TEXT,
+    effort_impact TEXT,
+    time_impact TEXT,
+    quality_risk_reduction TEXT,
+    multi_risk_note TEXT,
+    extra TEXT,
+    PRIMARY KEY (run_id, tradeoff, position)
+);
+
+CREATE TABLE IF NOT EXISTS comms (
+    run_id INTEGER PRIMARY KEY REFERENCES runs (id) ON DELETE CASCADE,
+    subject TEXT,
+    greeting TEXT,
+    body TEXT,
+    closing TEXT,
+    slide_title TEXT,
+    extra TEXT
+);
+
+CREATE TABLE IF NOT EXISTS comms_items (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    text TEXT,
+    PRIMARY KEY (run_id, kind, position)
+);
+
+CREATE TABLE IF NOT EXISTS ethics_concerns (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    concern TEXT,
+    severity TEXT,
+    explanation TEXT,
+    extra TEXT,
+    PRIMARY KEY (run_id, position)
+);
+CREATE INDEX IF NOT EXISTS ethics_concerns_severity ON ethics_concerns (severity);
+
+CREATE TABLE IF NOT EXISTS talent_risks (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    risk TEXT COLLATE NOCASE,
+    probability TEXT,
+    probability_pct REAL,
+    impact TEXT,
+    explanation TEXT,
+    extra TEXT,
+    PRIMARY KEY (run_id, position)
+);
+CREATE INDEX IF NOT EXISTS talent_risks_impact ON talent_risks (impact, probability_pct);
+
+CREATE TABLE IF NOT EXISTS mitigations (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    section TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    mitigation TEXT,
+    benefit TEXT,
+    extra TEXT,
+    PRIMARY KEY (run_id, section, position)
+);
+"""
+
+# Columns stored per item; any other keys an agent returns are kept in
+# the row's "extra" JSON so a reloaded run has the same shape as the original.
+RISK_COLUMNS = ("risk", "probability", "impact", "explanation")
+OPTION_COLUMNS = ("option", "effort_impact", "time_impact", "quality_risk_reduction", "multi_risk_note")
+CONCERN_COLUMNS = ("concern", "severity", "explanation")
+MITIGATION_COLUMNS = ("mitigation", "benefit")
+EMAIL_COLUMNS = ("subject", "greeting", "body", "closing")
+
+def fingerprint(project_input):
+    normalized = " ".join(project_input.lower().split())
+    return hashlib.sha256(normalized.encode()).hexdigest()[:16]
+
+
+def _split(item, columns):
+    item = item if isinstance(item, dict) else {columns[0]: item}
+    extra = {k: v for k, v in item.items() if k not in columns}
+    return [item.get(c) for c in columns] + [json.dumps(extra) if extra else None]
+
+
+def _join(row, columns):
+    *values, extra = row
+    item = {c: v for c, v in zip(columns, values) if v is not None}
+    if extra:
+        item.update(json.loads(extra))
+    return item
+
+
+class HistoryStore:
+    """SQLite history of finished simulations, searchable and reloadable."""
+
+    def __init__(self, db_path=DEFAULT_DB):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA foreign_keys = ON")
+        self._db.executescript(_SCHEMA)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(runs)")}
+        if "attachment" not in columns:  # databases created before uploads were recorded
+            self._db.execute("ALTER TABLE runs ADD COLUMN attachment TEXT")
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        # Off unless SHADOW_TPM_HISTORY_DB is set: every session of the app
+        # shares one database, so only enable it where all users may see
+        # each other's runs (a local or team deployment, not a public demo).
+        path = os.environ.get("SHADOW_TPM_HISTORY_DB")
+        return cls(path) if path else None
+
+    def save(self, result, project_input, label=None, attachment=None):
+        """Store a final_output; `attachment` is the upload's SHA-256, if any.
+        Returns the run ID."""
+        sections = [name for name in ("risks", "tradeoffs", "comms", "ethics", "talent") if result.get(name)]
+        with self._lock, self._db:
+            run_id = self._db.execute(
+                "INSERT INTO runs (fingerprint, created, label, project_input, mode, summary, sections, metrics, attachment) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (fingerprint(project_input), time.time(), label, project_input, result.get("mode"),
+                 result.get("summary"), ",".join(sections), json.dumps(result.get("metrics") or {}), attachment),
+            ).lastrowid
+            self._insert_risks("risks", run_id, result.get("risks") or [])
+            for t, item in enumerate(result.get("tradeoffs") or []):
+                self._db.execute("INSERT INTO tradeoffs VALUES (?, ?, ?, ?)",
+                                 (run_id, t, *_split({k: v for k, v in item.items() if k != "options"}, ("risk",))))
+                self._db.executemany(
+                    "INSERT INTO tradeoff_options VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(run_id, t, i, *_split(o, OPTION_COLUMNS)) for i, o in enumerate(item.get("options") or [])],
+                )
+            comms = result.get("comms") or {}
+            if comms:
+                email = comms.get("email_draft") or {}
+                slide = comms.get("slide_outline") or {}
+                extra = {k: v for k, v in comms.items() if k not in ("email_draft", "talking_points", "slide_outline")}
+                self._db.execute("INSERT INTO comms VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                 (run_id, *[email.get(c) for c in EMAIL_COLUMNS], slide.get("title"),
+                                  json.dumps(extra) if extra else None))
+                items = [("talking_point", comms.get("talking_points") or []), ("slide_bullet", slide.get("bullets") or [])]
+                self._db.executemany("INSERT INTO comms_items VALUES (?, ?, ?, ?)",
+                                     [(run_id, kind, i, text) for kind, texts in items for i, text in enumerate(texts)])
+            ethics = result.get("ethics") or {}
+            self._db.executemany("INSERT INTO ethics_concerns VALUES (?, ?, ?, ?, ?, ?)",
+                                 [(run_id, i, *_split(c, CONCERN_COLUMNS)) for i, c in enumerate(ethics.get("concerns") or [])])
+            talent = result.get("talent") or {}
+            self._insert_risks("talent_risks", run_id, talent.get("talent_risks") or [])
+            self._db.executemany(
+                "INSERT INTO mitigations VALUES (?, ?, ?, ?, ?, ?)",
+                [(run_id, section, i, *_split(m, MITIGATION_COLUMNS))
+                 for section, data in (("ethics", ethics), ("talent", talent))
+                 for i, m in enumerate(data.get("mitigations") or [])],
+            )
+        return run_id
+
+    def _insert_risks(self, table, run_id, risks):
+        rows = [_split(r, RISK_COLUMNS) for r in risks]
+        # Parsed the same way as the dashboard's probability_pct column.
+        percents = parse_probability([row[1] for row in rows])
+        percents = percents.astype(object).where(percents.notna(), None)
+        self._db.executemany(
+            f"INSERT INTO {table} VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(run_id, i, *row[:2], percent, *row[2:]) for i, (row, percent) in enumerate(zip(rows, percents))],
+        )
+
+    def load(self, run_id):
+        """(final_output, project_input, attachment SHA-256 or None) for a
+        stored run, or None."""
+        with self._lock:
+            run = self._db.execute(
+                "SELECT project_input, mode, summary, sections, metrics, attachment FROM runs WHERE id = ?", (run_id,)
+            ).fetchone()
+            if run is None:
+                return None
+            project_input, mode, summary, sections, metrics, attachment = run
+            sections = set(sections.split(","))
+            result = {"summary": summary, "risks": self._risks("risks", run_id)}
+
+            tradeoffs = []
+            for t, *row in self._db.execute(
+                    "SELECT position, risk, extra FROM tradeoffs WHERE run_id = ? ORDER BY position", (run_id,)):
+                options = self._db.execute(
+                    f"SELECT {', '.join(OPTION_COLUMNS)}, extra FROM tradeoff_options "
+                    "WHERE run_id = ? AND tradeoff = ? ORDER BY position", (run_id, t)).fetchall()
+                tradeoffs.append({**_join(row, ("risk",)), "options": [_join(o, OPTION_COLUMNS) for o in options]})
+            result["tradeoffs"] = tradeoffs
+
+            comms = {}
+            row = self._db.execute(
+                f"SELECT {', '.join(EMAIL_COLUMNS)}, slide_title, extra FROM comms WHERE run_id = ?", (run_id,)
+            ).fetchone()
+            if row is not None:
+                items = {"talking_point": [], "slide_bullet": []}
+                for kind, text in self._db.execute(
+                        "SELECT kind, text FROM comms_items WHERE run_id = ? ORDER BY kind, position", (run_id,)):
+                    items[kind].append(text)
+                comms = {
+                    "email_draft": dict(zip(EMAIL_COLUMNS, row[:4])),
+                    "talking_points": items["talking_point"],
+                    "slide_outline": {"title": row[4], "bullets": items["slide_bullet"]},
+                    **(json.loads(row[5]) if row[5] else {}),
+                }
+            result["comms"] = comms
+
+            mitigations = {"ethics": [], "talent": []}
+            for section, *row in self._db.execute(
+                    f"SELECT section, {', '.join(MITIGATION_COLUMNS)}, extra FROM mitigations "
+                    "WHERE run_id = ? ORDER BY section, position", (run_id,)):
+                mitigations[section].append(_join(row, MITIGATION_COLUMNS))
+            concerns = [_join(row, CONCERN_COLUMNS) for row in self._db.execute(
+                f"SELECT {', '.join(CONCERN_COLUMNS)}, extra FROM ethics_concerns WHERE run_id = ? ORDER BY position",
+                (run_id,))]
+            result["ethics"] = {"concerns": concerns, "mitigations": mitigations["ethics"]} if "ethics" in sections else {}
+            result["talent"] = ({"talent_risks": self._risks("talent_risks", run_id), "mitigations": mitigations["talent"]}
+                                if "talent" in sections else {})
+        if mode:
+            result["mode"] = mode
+        result["metrics"] = json.loads(metrics) if metrics else {}
+        return result, project_input, attachment
+
+    def _risks(self, table, run_id):
+        rows = self._db.execute(
+            f"SELECT {', '.join(RISK_COLUMNS)}, extra FROM {table} WHERE run_id = ? ORDER BY position", (run_id,)
+        ).fetchall()
+        return [_join(row, RISK_COLUMNS) for row in rows]
+
+    def search(self, query="", impact=None, min_probability=None, limit=50):
+        """Runs, newest first, whose description, label or a risk contains
+        `query`, and that have a risk with the given impact and at least
+        `min_probability` percent."""
+        where, params = [], []
+        if query.strip():
+            pattern = "%" + query.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            where.append("(runs.project_input LIKE ? ESCAPE '\\' OR runs.label LIKE ? ESCAPE '\\' OR EXISTS "
+                         "(SELECT 1 FROM risks r WHERE r.run_id = runs.id AND r.risk LIKE ? ESCAPE '\\'))")
+            params += [pattern] * 3
+        risk_filters, risk_params = [], []
+        if impact:
+            risk_filters.append("r.impact = ?")
+            risk_params.append(impact)
+        if min_probability:
+            risk_filters.append("r.probability_pct >= ?")
+            risk_params.append(min_probability)
+        if risk_filters:
+            where.append(f"EXISTS (SELECT 1 FROM risks r WHERE r.run_id = runs.id AND {' AND '.join(risk_filters)})")
+            params += risk_params
+        sql = (
+            "SELECT runs.id, runs.created, runs.label, runs.project_input, runs.mode, runs.fingerprint, "
+            "(SELECT COUNT(*) FROM risks r WHERE r.run_id = runs.id), "
+            "(SELECT COUNT(*) FROM risks r WHERE r.run_id = runs.id AND r.impact = 'High') "
+            f"FROM runs {'WHERE ' + ' AND '.join(where) if where else ''} ORDER BY runs.created DESC, runs.id DESC LIMIT ?"
+        )
+        with self._lock:
+            rows = self._db.execute(sql, (*params, limit)).fetchall()
+        keys = ("id", "created", "label", "project_input", "mode", "fingerprint", "risks", "high_risks")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def trend(self, fingerprint, limit=20):
+        """The risk profile of a program's last `limit` runs, oldest first:
+        {"runs": [per-run counts and mean probability], "risks": [per-risk rows]}."""
+        with self._lock:
+            runs = self._db.execute(
+                "SELECT id, created, label, mode, "
+                "(SELECT COUNT(*) FROM risks r WHERE r.run_id = runs.id), "
+                "(SELECT AVG(probability_pct) FROM risks r WHERE r.run_id = runs.id), "
+                "(SELECT COUNT(*) FROM risks r WHERE r.run_id = runs.id AND r.impact = 'High'), "
+                "(SELECT COUNT(*) FROM risks r WHERE r.run_id = runs.id AND r.impact = 'Medium'), "
+                "(SELECT COUNT(*) FROM risks r WHERE r.run_id = runs.id AND r.impact = 'Low') "
+                "FROM runs WHERE fingerprint = ? ORDER BY created DESC, id DESC LIMIT ?", (fingerprint, limit)
+            ).fetchall()[::-1]
+            ids = [row[0] for row in runs]
+            risks = self._db.execute(
+                f"SELECT run_id, risk, probability_pct, impact FROM risks WHERE run_id IN ({', '.join('?' * len(ids))}) "
+                "ORDER BY run_id, position", ids
+            ).fetchall() if ids else []
+        run_keys = ("id", "created", "label", "mode", "risks", "mean_probability", "High", "Medium", "Low")
+        return {
+            "runs": [dict(zip(run_keys, row)) for row in runs],
+            "risks": [dict(zip(("run_id", "risk", "probability", "impact"), row)) for row in risks],
+        }
+
+    def delete(self, run_id):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM runs WHERE id = ?", (run_id,))
+
+    def stats(self):
+        with self._lock:
+            runs, programs = self._db.execute("SELECT COUNT(*), COUNT(DISTINCT fingerprint) FROM runs").fetchone()
+        return {"runs": runs, "programs": programs}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,152 @@
+import pandas as pd
+
+# Agents answer with strings ("65%", "-2 weeks", "+$1.5M"). Each section is
+# parsed once, right after it arrives, into a DataFrame with typed numeric
+# columns next to the original text; charts, the Key Impact Summary and the
+# scenario/batch views aggregate those columns with pandas instead of
+# re-parsing strings per row. Unparseable values are NaN, never errors.
+#
+#   probability_pct     risk probability in percent (0.65 and "65%" are both 65.0;
+#                       a range such as "60-70%" is its midpoint)
+#   time_weeks          schedule impact in weeks; negative means faster
+#   cost_musd           cost impact in $M; negative means a saving
+#   risk_reduction_pct  quality/risk reduction in percent
+
+RISK_FIELDS = ["risk", "probability", "impact", "explanation"]
+OPTION_FIELDS = ["option", "effort_impact", "time_impact", "cost_impact", "quality_risk_reduction", "multi_risk_note"]
+
+# A number or a range ("20-30", "20% to 30"); the sign must not follow a
+# digit, so the dash inside a range is never read as a minus.
+_NUMBER = (r"(?<![\d.])(?P<sign>[+\-]?)(?P<value>\d+(?:\.\d+)?)"
+           r"(?:\s*%?\s*(?:-|–|to)\s*(?P<high>\d+(?:\.\d+)?))?")
+_PERCENT = _NUMBER + r"\s*%"
+_DURATION = (r"(?P<sign>[+\-−–]?)\s*(?P<value>\d+(?:\.\d+)?)(?:\s*(?:-|–|to)\s*[+\-]?\d+(?:\.\d+)?)?"
+             r"\s*(?P<unit>days?|weeks?|wks?|months?|mos?)\b")
+_COST = (r"(?P<sign>[+\-−–]?)\s*\$\s*(?P<value>\d+(?:,\d{3})*(?:\.\d+)?)"
+         r"\s*(?P<unit>thousand|million|billion|[kmb])?\b")
+_FASTER = r"\b(?:sav|faster|earlier|ahead|accelerat|shorten)"
+_SAVING = r"\b(?:sav|cheaper)"
+_NO_CHANGE = r"\b(?:no (?:change|impact|delay|cost)|none|neutral|negligible)\b"
+
+_WEEKS_PER_UNIT = {"day": 1 / 7, "week": 1.0, "wk": 1.0, "month": 4.345, "mo": 4.345}
+_MUSD_PER_UNIT = {"k": 1e-3, "thousand": 1e-3, "m": 1.0, "million": 1.0, "b": 1e3, "billion": 1e3}
+
+
+def _text(values):
+    return pd.Series(values, dtype="string").str.lower().str.strip()
+
+
+def _ranged(parts):
+    # The value, or a range's midpoint, with its sign.
+    value = pd.to_numeric(parts["value"], errors="coerce").astype(float)
+    high = pd.to_numeric(parts["high"], errors="coerce").astype(float)
+    value = value.where(high.isna(), (value + high) / 2)
+    return value.where(parts["sign"] != "-", -value)
+
+
+def parse_percent(values):
+    return _ranged(_text(values).str.extract(_PERCENT))
+
+
+def parse_probability(values):
+    # "65%" and a bare 65 (or 1) are percentages; a bare decimal fraction
+    # (0.65, "1.0") is scaled up.
+    text = _text(values)
+    percent = parse_percent(text)
+    parts = text.str.extract(_NUMBER)
+    bare = _ranged(parts)
+    fraction = parts["value"].str.contains(".", regex=False).fillna(False).astype(bool) & (bare <= 1)
+    return percent.fillna(bare.mask(fraction, bare * 100))
+
+
+def _signed(parts, magnitude, text, keywords):
+    negative = parts["sign"].isin(["-", "−", "–"]) | (parts["sign"].fillna("").eq("") & text.str.contains(keywords, na=False))
+    no_change = magnitude.isna() & text.str.contains(_NO_CHANGE, na=False)
+    return magnitude.where(~negative, -magnitude).mask(no_change, 0.0)
+
+
+def parse_weeks(values):
+    text = _text(values)
+    parts = text.str.extract(_DURATION)
+    unit = parts["unit"].str.rstrip("s").map(_WEEKS_PER_UNIT)
+    magnitude = pd.to_numeric(parts["value"], errors="coerce").astype(float) * unit.astype(float)
+    return _signed(parts, magnitude, text, _FASTER)
+
+
+def parse_cost(values):
+    text = _text(values)
+    parts = text.str.extract(_COST)
+    value = pd.to_numeric(parts["value"].str.replace(",", "", regex=False), errors="coerce").astype(float)
+    scale = parts["unit"].map(_MUSD_PER_UNIT).astype(float).fillna(1e-6)  # "$500" is dollars
+    return _signed(parts, value * scale, text, _SAVING)
+
+
+def risk_frame(risks):
+    df_risks = pd.DataFrame(risks or [])
+    df_risks = df_risks.reindex(columns=list(dict.fromkeys(RISK_FIELDS + list(df_risks.columns))))
+    df_risks["probability_pct"] = parse_probability(df_risks["probability"]).to_numpy()
+    return df_risks
+
+
+def option_frame(tradeoffs):
+    """One row per mitigation option, with `tradeoff` (position) and `risk` columns."""
+    rows = [{**option, "tradeoff": t, "risk": item.get("risk", "")}
+            for t, item in enumerate(tradeoffs or []) for option in item.get("options") or []]
+    df_options = pd.DataFrame(rows)
+    columns = ["tradeoff", "risk"] + OPTION_FIELDS
+    df_options = df_options.reindex(columns=list(dict.fromkeys(columns + list(df_options.columns))))
+    df_options["tradeoff"] = df_options["tradeoff"].astype("Int64")
+    df_options["time_weeks"] = parse_weeks(df_options["time_impact"]).to_numpy()
+    df_options["cost_musd"] = parse_cost(df_options["cost_impact"]).to_numpy()
+    df_options["risk_reduction_pct"] = parse_percent(df_options["quality_risk_reduction"]).to_numpy()
+    return df_options
+
+
+NUMERIC_COLUMNS = ("probability_pct", "time_weeks", "cost_musd", "risk_reduction_pct")
+
+
+def display_frame(df, *drop):
+    # The frame as the agent wrote it, for tables.
+    return df.drop(columns=[*NUMERIC_COLUMNS, *drop], errors="ignore").dropna(axis=1, how="all")
+
+
+def normalize_section(name, section):
+    """Typed frames for one orchestrator section, keyed like the section."""
+    if name == "risks":
+        return {"risks": risk_frame(section)}
+    if name == "tradeoffs":
+        return {"options": option_frame(section)}
+    if name == "talent":
+        return {"talent": risk_frame((section or {}).get("talent_risks"))}
+    return {}
+
+
+def normalize_result(result):
+    frames = {}
+    for name in ("risks", "tradeoffs", "talent"):
+        frames.update(normalize_section(name, result.get(name)))
+    return frames
+
+
+def impact_summary(df_options):
+    """Key Impact Summary over an option_frame; None where nothing parsed."""
+    delay_saved = -df_options["time_weeks"].where(df_options["time_weeks"] < 0)
+    return {
+        "max_delay_reduction": _number(delay_saved.max()),
+        "min_cost_impact": _number(df_options["cost_musd"].min()),
+        "max_risk_reduction": _number(df_options["risk_reduction_pct"].max()),
+    }
+
+
+def impact_summary_by(df_options, key):
+    """impact_summary per value of `key` (e.g. a scenario or program column), in one groupby."""
+    grouped = df_options.assign(delay_saved=-df_options["time_weeks"].where(df_options["time_weeks"] < 0)).groupby(key, sort=False)
+    return pd.DataFrame({
+        "max_delay_reduction": grouped["delay_saved"].max(),
+        "min_cost_impact": grouped["cost_musd"].min(),
+        "max_risk_reduction": grouped["risk_reduction_pct"].max(),
+    })
+
+
+def _number(value):
+    return None if pd.isna(value) else round(float(value), 2)
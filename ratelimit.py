@@ -0,0 +1,171 @@
+import os
+import random
+import re
+import threading
+import time
+
+from google.api_core import exceptions as api_exceptions
+
+QUOTA_ERRORS = (api_exceptions.ResourceExhausted, api_exceptions.TooManyRequests)
+TRANSIENT_ERRORS = (
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.InternalServerError,
+    api_exceptions.DeadlineExceeded,
+    api_exceptions.GatewayTimeout,
+    api_exceptions.Aborted,
+    ConnectionError,
+    TimeoutError,
+)
+
+_RETRY_HINTS = (
+    re.compile(r"retry in ([\d.]+)\s*s", re.IGNORECASE),
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)", re.IGNORECASE),
+    re.compile(r"retry[- ]after:?\s*([\d.]+)", re.IGNORECASE),
+)
+
+
+class QuotaExhaustedError(RuntimeError):
+    pass
+
+
+class TokenBucket:
+    """Refills continuously at per_minute / 60 units per second up to per_minute."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self.level >= amount:
+                    self.level -= amount
+                    return
+                wait = (amount - self.level) / self.rate
+            time.sleep(wait)
+
+    def adjust(self, amount):
+        # Settle the difference between an estimate and the reported usage.
+        with self._lock:
+            self._refill(time.monotonic())
+            self.level = min(self.capacity, self.level - amount)
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive quota failures and rejects calls for
+    `cooldown` seconds; one trial call is let through afterwards."""
+
+    def __init__(self, threshold=5, cooldown=60.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def check(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.opened_at + self.cooldown - time.monotonic()
+            if remaining > 0:
+                raise QuotaExhaustedError(
+                    f"Gemini quota exhausted for this API key. Try again in {remaining:.0f}s or use another key."
+                )
+            self.opened_at = None  # half-open: allow a trial call
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self, fatal=False):
+        with self._lock:
+            self.failures += 1
+            if fatal or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self.opened_at is not None
+
+
+def retry_after(error):
+    for pattern in _RETRY_HINTS:
+        match = pattern.search(str(error))
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def estimate_tokens(content):
+    parts = content if isinstance(content, list) else [content]
+    total = 0
+    for part in parts:
+        if isinstance(part, dict):
+            total += 258  # Gemini bills an image or document page at roughly this many tokens
+        else:
+            total += len(str(part)) // 4
+    return max(1, total)
+
+
+class RateLimiter:
+    """Request- and token-per-minute limits plus retries for one API key.
+
+    Every model call made with the key goes through call(), so agents running
+    in parallel share one budget instead of each bursting into 429s.
+    """
+
+    def __init__(self, rpm=None, tpm=None, max_retries=4, base_delay=1.0, max_delay=60.0,
+                 breaker_threshold=5, breaker_cooldown=60.0):
+        rpm = rpm or float(os.environ.get("SHADOW_TPM_RPM", 10))
+        tpm = tpm or float(os.environ.get("SHADOW_TPM_TPM", 250_000))
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+
+    def backoff(self, attempt, error=None):
+        hint = retry_after(error) if error is not None else None
+        if hint is not None:
+            return min(self.max_delay, hint) + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    # Returns (result, retries). usage(result) may report the tokens actually
+    # billed so the token bucket can be corrected after the fact. With
+    # retry_quota=False a quota error is raised at once (as
+    # QuotaExhaustedError), for callers that have another model to try.
+    def call(self, fn, estimated_tokens=1, usage=None, retry_quota=True):
+        for attempt in range(self.max_retries + 1):
+            self.breaker.check()
+            self.requests.acquire(1)
+            self.tokens.acquire(estimated_tokens)
+            try:
+                result = fn()
+            except QUOTA_ERRORS as e:
+                self.breaker.record_failure(fatal="per day" in str(e).lower() or "perday" in str(e).lower())
+                if not retry_quota or attempt == self.max_retries or self.breaker.is_open:
+                    raise QuotaExhaustedError(f"Gemini quota exceeded: {e}") from e
+                time.sleep(self.backoff(attempt, e))
+            except TRANSIENT_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff(attempt, e))
+            else:
+                self.breaker.record_success()
+                if usage is not None:
+                    actual = usage(result)
+                    if actual:
+                        self.tokens.adjust(actual - estimated_tokens)
+                return result, attempt
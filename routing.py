@@ -0,0 +1,76 @@
+import json
+import os
+
+from backends import DEFAULT_MODEL
+
+# Which model each agent uses. Agents get a tier and a latency budget; a call
+# that runs over its budget or whose model is out of quota is retried on the
+# next faster tier straight away. The budget holds for every candidate,
+# including the last, so no route can hang past it. Every call records the
+# model that actually answered (see RunMetrics).
+#
+# Override with SHADOW_TPM_ROUTES=routes.json:
+#   {"tiers": {"strong": "gemini-3-flash-preview", ...},
+#    "agents": {"comms_influencer": {"tier": "fast", "latency_budget_s": 10}}}
+
+MODEL_TIERS = {
+    "strong": DEFAULT_MODEL,
+    "standard": "gemini-2.5-flash",
+    "fast": "gemini-2.5-flash-lite",
+}
+TIER_ORDER = ("strong", "standard", "fast")  # slowest to fastest
+
+DEFAULT_ROUTES = {
+    "risk_forecaster": {"tier": "strong", "latency_budget_s": 60.0},
+    "fast_analyst": {"tier": "strong", "latency_budget_s": 45.0},
+    "trade_off_optimizer": {"tier": "standard", "latency_budget_s": 30.0},
+    "ethics_checker": {"tier": "standard", "latency_budget_s": 20.0},
+    "talent_risk_simulator": {"tier": "standard", "latency_budget_s": 20.0},
+    "comms_influencer": {"tier": "fast", "latency_budget_s": 15.0},
+}
+
+
+class LatencyBudgetExceeded(RuntimeError):
+    pass
+
+
+class Router:
+    """Model tier and latency budget per agent, with faster tiers to fall back to."""
+
+    def __init__(self, tiers=None, routes=None, default_tier="strong"):
+        unknown = set(tiers or {}) - set(TIER_ORDER)
+        if unknown:
+            raise ValueError(f"Unknown model tiers {sorted(unknown)}; tiers are {', '.join(TIER_ORDER)}")
+        self.tiers = {**MODEL_TIERS, **(tiers or {})}
+        self.routes = {agent: dict(route) for agent, route in DEFAULT_ROUTES.items()}
+        for agent, route in (routes or {}).items():
+            self.routes.setdefault(agent, {}).update(route)
+        self.default_tier = default_tier
+        for agent, route in self.routes.items():
+            if route.get("tier", default_tier) not in self.tiers:
+                raise ValueError(f"Unknown model tier {route['tier']!r} for {agent}; known tiers: {', '.join(self.tiers)}")
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+        return cls(config.get("tiers"), config.get("agents"), config.get("default_tier", "strong"))
+
+    @classmethod
+    def from_env(cls):
+        path = os.environ.get("SHADOW_TPM_ROUTES")
+        return cls.from_file(path) if path else cls()
+
+    def candidates(self, agent):
+        """[(model_name, latency_budget_s)] to try in order."""
+        route = self.routes.get(agent.split(":")[0], {})
+        tier = route.get("tier", self.default_tier)
+        budget = route.get("latency_budget_s")
+        models = []
+        for name in TIER_ORDER[TIER_ORDER.index(tier):]:
+            if self.tiers[name] not in models:
+                models.append(self.tiers[name])
+        return [(model, budget) for model in models]
+
+    def budget(self, agent):
+        return self.routes.get(agent.split(":")[0], {}).get("latency_budget_s")
@@ -0,0 +1,122 @@
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from agents import MAX_CONCURRENT_AGENTS, attachment_store, client_pool, orchestrator
+from attachments import AttachmentError
+
+# What-if sweeps: one base description, several parameter variations, every
+# combination simulated side by side. Variants run in parallel on one shared
+# ModelHandle (one rate limiter per key) and go through the normal
+# orchestrator, so the upload is hashed and extracted once, and any stage whose
+# inputs match an earlier run or another variant comes from the stage memo
+# or response cache instead of a new model call.
+
+MAX_SCENARIOS = 8
+MAX_PARALLEL_SCENARIOS = 3
+
+
+def parse_variations(text):
+    """Parse "name: value | value" lines into {name: [values]}."""
+    variations = {}
+    for line in text.splitlines():
+        if ":" not in line:
+            continue
+        name, values = line.split(":", 1)
+        values = [v.strip() for v in values.split("|") if v.strip()]
+        if name.strip() and values:
+            variations[name.strip()] = values
+    return variations
+
+
+def apply_parameters(base, parameters):
+    # "{deadline}" in the description is replaced in place; parameters with no
+    # placeholder are stated after it.
+    text = base
+    appended = []
+    for name, value in parameters.items():
+        placeholder = "{" + name + "}"
+        if placeholder in text:
+            text = text.replace(placeholder, value)
+        else:
+            appended.append(f"{name}: {value}")
+    if appended:
+        text = f"{text.rstrip()}\nScenario assumptions: {'; '.join(appended)}."
+    return text
+
+
+def expand_scenarios(base, variations, max_scenarios=MAX_SCENARIOS):
+    """Every combination of the variations, the first value of each being the baseline."""
+    names = list(variations)
+    scenarios = []
+    seen = set()
+    for values in itertools.product(*(variations[n] for n in names)):
+        parameters = dict(zip(names, values))
+        project_input = apply_parameters(base, parameters)
+        if project_input in seen:
+            continue
+        seen.add(project_input)
+        scenarios.append({
+            "label": ", ".join(f"{n}={v}" for n, v in parameters.items()) or "baseline",
+            "parameters": parameters,
+            "project_input": project_input,
+        })
+    if len(scenarios) > max_scenarios:
+        raise ValueError(f"{len(scenarios)} scenarios requested; the limit is {max_scenarios}. Use fewer values per parameter.")
+    return scenarios
+
+
+# Yields (index, scenario) as each variant finishes, where scenario is the
+# expand_scenarios entry plus its "result" (final_output or an error dict).
+def sweep_stream(base, variations, uploaded_file=None, user_api_key="", handle=None,
+                 max_parallel=MAX_PARALLEL_SCENARIOS, max_workers=MAX_CONCURRENT_AGENTS, mode="thorough"):
+    scenarios = expand_scenarios(base, variations)
+    if handle is None:
+        if not user_api_key.strip():
+            error = {"error": "No Gemini API key provided. Please enter your own key in the sidebar to run simulations. Get a free key at https://aistudio.google.com/app/apikey"}
+            for index, scenario in enumerate(scenarios):
+                yield index, {**scenario, "result": error}
+            return
+        with client_pool.lease(user_api_key.strip()) as handle:
+            yield from sweep_stream(base, variations, uploaded_file, handle=handle, max_parallel=max_parallel,
+                                    max_workers=max_workers, mode=mode)
+        return
+
+    # Read the upload once here; the variants share the Attachment.
+    try:
+        attachment = attachment_store.load(uploaded_file)
+    except AttachmentError as e:
+        for index, scenario in enumerate(scenarios):
+            yield index, {**scenario, "result": {"error": str(e)}}
+        return
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel)) as pool:
+        futures = {
+            pool.submit(orchestrator, s["project_input"], attachment, max_workers=max_workers, handle=handle, mode=mode): index
+            for index, s in enumerate(scenarios)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"error": f"Scenario failed: {e}"}
+            yield index, {**scenarios[index], "result": result}
+
+
+def summarize_sweep(finished, started):
+    """Order sweep_stream output by scenario and count reused vs computed stages."""
+    scenarios = [finished[i] for i in sorted(finished)]
+    stages = [info for s in scenarios for info in s["result"].get("stages", {}).values()]
+    return {
+        "scenarios": scenarios,
+        "wall_s": round(time.perf_counter() - started, 4),
+        "stages_reused": sum(1 for info in stages if info["reused"]),
+        "stages_run": sum(1 for info in stages if not info["reused"]),
+    }
+
+
+def run_sweep(base, variations, uploaded_file=None, user_api_key="", handle=None,
+              max_parallel=MAX_PARALLEL_SCENARIOS, max_workers=MAX_CONCURRENT_AGENTS, mode="thorough"):
+    started = time.perf_counter()
+    finished = dict(sweep_stream(base, variations, uploaded_file, user_api_key, handle, max_parallel, max_workers, mode))
+    return {"base": base, "variations": variations, **summarize_sweep(finished, started)}
@@ -0,0 +1,238 @@
+import json
+import re
+
+# Response schemas per agent, in the OpenAPI subset Gemini accepts as
+# `response_schema`. The same schemas are checked locally after parsing, so
+# a reply that slips through malformed is repaired here rather than
+# discovered by the dashboard.
+
+IMPACT = {"type": "string", "enum": ["High", "Medium", "Low"]}
+
+# Words models use instead of an enum value; matched case-insensitively.
+ENUM_SYNONYMS = {
+    "critical": "High", "severe": "High", "very high": "High", "major": "High",
+    "moderate": "Medium", "med": "Medium", "medium-high": "Medium", "medium-low": "Medium",
+    "minor": "Low", "very low": "Low", "negligible": "Low",
+}
+
+
+def _obj(properties, required=None):
+    return {"type": "object", "properties": properties, "required": list(required or properties)}
+
+
+def _array(items):
+    return {"type": "array", "items": items}
+
+
+_STRING = {"type": "string"}
+
+_MITIGATIONS = _array(_obj({"mitigation": _STRING, "benefit": _STRING}))
+
+RISKS_SCHEMA = _obj({
+    "risks": _array(_obj({
+        "risk": _STRING,
+        "probability": _STRING,
+        "impact": IMPACT,
+        "explanation": _STRING,
+    })),
+})
+
+TRADEOFFS_SCHEMA = _obj({
+    "tradeoffs": _array(_obj({
+        "risk": _STRING,
+        "options": _array(_obj({
+            "option": _STRING,
+            "effort_impact": _STRING,
+            "time_impact": _STRING,
+            "cost_impact": _STRING,
+            "quality_risk_reduction": _STRING,
+            "multi_risk_note": _STRING,
+        }, required=["option", "effort_impact", "time_impact", "quality_risk_reduction"])),
+    })),
+})
+
+COMMS_SCHEMA = _obj({
+    "email_draft": _obj({"subject": _STRING, "greeting": _STRING, "body": _STRING, "closing": _STRING}),
+    "talking_points": _array(_STRING),
+    "slide_outline": _obj({"title": _STRING, "bullets": _array(_STRING)}),
+})
+
+ETHICS_SCHEMA = _obj({
+    "concerns": _array(_obj({"concern": _STRING, "severity": IMPACT, "explanation": _STRING})),
+    "mitigations": _MITIGATIONS,
+})
+
+TALENT_SCHEMA = _obj({
+    "talent_risks": _array(_obj({
+        "risk": _STRING,
+        "probability": _STRING,
+        "impact": IMPACT,
+        "explanation": _STRING,
+    })),
+    "mitigations": _MITIGATIONS,
+})
+
+# Fast mode asks for four sections in one call.
+FAST_SCHEMA = _obj({
+    "risks": RISKS_SCHEMA["properties"]["risks"],
+    "tradeoffs": TRADEOFFS_SCHEMA["properties"]["tradeoffs"],
+    "ethics": ETHICS_SCHEMA,
+    "talent": TALENT_SCHEMA,
+})
+
+AGENT_SCHEMAS = {
+    "risk_forecaster": RISKS_SCHEMA,
+    "trade_off_optimizer": TRADEOFFS_SCHEMA,
+    "comms_influencer": COMMS_SCHEMA,
+    "ethics_checker": ETHICS_SCHEMA,
+    "talent_risk_simulator": TALENT_SCHEMA,
+    "fast_analyst": FAST_SCHEMA,
+}
+
+
+# ──────────────────────────────────────────────
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.DOTALL | re.IGNORECASE)
+_DANGLING_KEY = re.compile(r'([{,])\s*"(?:[^"\\]|\\.)*"\s*:?\s*$')
+
+
+def _trim_dangling(text, stack):
+    # Truncation can stop after a separator or an object key with no value.
+    while True:
+        before = text
+        text = text.rstrip().rstrip(",:").rstrip()
+        if stack and stack[-1] == "}":
+            text = _DANGLING_KEY.sub(r"\1", text)
+        if text == before:
+            return text
+
+
+def _drop_trailing_comma(out):
+    # Called only outside strings, so a ", ]" inside model text is kept.
+    end = len(out)
+    while end and out[end - 1].isspace():
+        end -= 1
+    if end and out[end - 1] == ",":
+        del out[end - 1:]
+
+
+def repair_json(text):
+    """Parse model output that is almost JSON.
+
+    Handles markdown fences, prose around the object, trailing commas,
+    unmatched closing brackets and output truncated mid-string or mid-object.
+    Raises ValueError if nothing usable is left.
+    """
+    if text is None:
+        raise ValueError("empty response")
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+
+    fenced = _FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    start = min((i for i in (text.find("{"), text.find("[")) if i != -1), default=-1)
+    if start == -1:
+        raise ValueError("no JSON object in response")
+    text = text[start:]
+
+    out = []
+    stack = []
+    in_string = escaped = False
+    for ch in text:
+        if in_string:
+            out.append(ch)
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if not stack or stack[-1] != ch:
+                continue  # stray closer, e.g. the "]]}" some replies end with
+            _drop_trailing_comma(out)
+            stack.pop()
+            out.append(ch)
+            if not stack:
+                break
+            continue
+        out.append(ch)
+
+    repaired = "".join(out)
+    if in_string:
+        repaired = (repaired[:-1] if escaped else repaired) + '"'
+    repaired = _trim_dangling(repaired, stack) + "".join(reversed(stack))
+    try:
+        return json.loads(repaired)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"could not repair JSON: {e}") from e
+
+
+def conform(data, schema, path="$"):
+    """Check data against schema, filling in what can be filled sensibly.
+
+    Missing nested fields become empty values, scalars become strings, enum
+    values are matched case-insensitively (or via ENUM_SYNONYMS) and a lone
+    item becomes a one-element list. Returns (data, problems); problems cover
+    missing top-level keys, values of a shape that cannot be coerced and
+    values outside an enum.
+    """
+    problems = []
+    kind = schema.get("type")
+    if kind == "object":
+        if not isinstance(data, dict):
+            return data, [f"{path}: expected object"]
+        for key, sub in schema.get("properties", {}).items():
+            if key not in data or data[key] is None:
+                if key in schema.get("required", []):
+                    if path == "$":
+                        problems.append(f"{path}.{key}: missing")
+                        continue
+                    data[key] = [] if sub.get("type") == "array" else {} if sub.get("type") == "object" else ""
+                else:
+                    continue
+            data[key], sub_problems = conform(data[key], sub, f"{path}.{key}")
+            problems.extend(sub_problems)
+    elif kind == "array":
+        if isinstance(data, (dict, str)):
+            data = [data]
+        if not isinstance(data, list):
+            return data, [f"{path}: expected array"]
+        conformed = []
+        for i, item in enumerate(data):
+            item, sub_problems = conform(item, schema["items"], f"{path}[{i}]")
+            problems.extend(sub_problems)
+            conformed.append(item)
+        data = conformed
+    elif kind == "string":
+        if not isinstance(data, str):
+            data = "" if data is None else str(data)
+        if "enum" in schema and data not in schema["enum"]:
+            key = " ".join(data.lower().split())
+            match = next((v for v in schema["enum"] if v.lower() == key), ENUM_SYNONYMS.get(key))
+            if match in schema["enum"]:
+                data = match
+            else:
+                problems.append(f"{path}: {data!r} is not one of {', '.join(schema['enum'])}")
+    return data, problems
+
+
+def parse_response(text, schema=None):
+    """Return (parsed, problem); parsed is None when the reply is unusable."""
+    try:
+        data = repair_json(text)
+    except ValueError as e:
+        return None, str(e)
+    if schema is None:
+        return data, None
+    data, problems = conform(data, schema)
+    if problems:
+        return None, "; ".join(problems)
+    return data, None
@@ -0,0 +1,362 @@
+import argparse
+import asyncio
+import base64
+import binascii
+import io
+import json
+import os
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from agents import MAX_CONCURRENT_AGENTS, PIPELINES, attachment_store, client_pool, orchestrator_stream, response_cache
+
+# Headless HTTP service: simulations are submitted as jobs, run by a bounded
+# pool of workers and streamed back per agent as server-sent events. All jobs
+# share this process's client pool, response cache and stage memo, so a job
+# for a program that was simulated before costs no quota. Standard library
+# only (asyncio streams); one request per connection.
+#
+#   POST /jobs              {"project_input": "...", "mode": "fast",
+#                            "attachment": {"name", "mime_type", "data": base64}}
+#                           -> 202 {"job_id", ...}, or 503 + Retry-After when the queue is full
+#   GET  /jobs/<id>         status, and the result once finished
+#   GET  /jobs/<id>/events  text/event-stream: queued, started, one event per
+#                           section (risks, tradeoffs, ...), then done or error
+#   GET  /health            queue depth, workers and cache stats
+#
+# The API key comes from the X-Gemini-Api-Key header, "api_key" in the body,
+# or the server's --api-key. SHADOW_TPM_BACKEND=fake serves from the stub model.
+
+MAX_BODY_BYTES = 28 * 1024 * 1024  # a 20MB attachment, base64-encoded
+MAX_HEADER_BYTES = 64 * 1024  # request line and headers together
+READ_TIMEOUT_SECONDS = 60  # to receive the whole request, attachment included
+MAX_FINISHED_JOBS = 256
+RETRY_AFTER_SECONDS = 5
+
+REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           408: "Request Timeout", 413: "Payload Too Large", 431: "Request Header Fields Too Large",
+           503: "Service Unavailable"}
+
+
+class UploadedBytes(io.BytesIO):
+    """An attachment sent inline, shaped like Streamlit's UploadedFile."""
+
+    def __init__(self, data, name, mime_type):
+        super().__init__(data)
+        self.name = name
+        self.type = mime_type
+
+
+class Job:
+    def __init__(self, request):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.status = "queued"
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.events = []  # (event, data); replayed to every subscriber
+        self._changed = asyncio.get_running_loop().create_future()
+
+    @property
+    def done(self):
+        return self.status in ("done", "error")
+
+    def publish(self, event, data):
+        self.events.append((event, data))
+        self._changed.set_result(None)
+        self._changed = asyncio.get_running_loop().create_future()
+
+    async def wait(self, seen):
+        # Returns once there are events past `seen` or the job has finished.
+        if len(self.events) <= seen and not self.done:
+            await asyncio.shield(self._changed)
+
+    def describe(self):
+        info = {"job_id": self.id, "status": self.status, "created": self.created, "started": self.started,
+                "finished": self.finished, "mode": self.request["mode"]}
+        if self.status == "done":
+            info["result"] = self.result
+        elif self.status == "error":
+            info["error"] = self.result["error"]
+        return info
+
+
+class SimulationService:
+    """Job queue with backpressure in front of a bounded orchestrator pool."""
+
+    def __init__(self, api_key="", workers=2, max_queued=16, agent_workers=MAX_CONCURRENT_AGENTS, handle=None,
+                 read_timeout=READ_TIMEOUT_SECONDS):
+        self.api_key = api_key
+        self.read_timeout = read_timeout  # an idle client is dropped after this
+        self.workers = workers
+        self.agent_workers = agent_workers
+        self.handle = handle  # run every job on this ModelHandle instead of one per key
+        self.jobs = OrderedDict()
+        self._queue = asyncio.Queue(maxsize=max_queued)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shadow-tpm-job")
+        self._tasks = []
+        self._running = 0
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, request):
+        """Queue a validated request; raises asyncio.QueueFull when at capacity."""
+        job = Job(request)
+        self._queue.put_nowait(job)
+        self.jobs[job.id] = job
+        job.publish("queued", {"job_id": job.id, "position": self._queue.qsize()})
+        self._trim()
+        return job
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            self._running += 1
+            job.status = "running"
+            job.started = time.time()
+            job.publish("started", {"job_id": job.id, "queued_s": round(job.started - job.created, 3)})
+            try:
+                result = await loop.run_in_executor(self._executor, self._run, job, loop)
+            except Exception as e:
+                result = {"error": f"{type(e).__name__}: {e}"}
+            job.finished = time.time()
+            job.result = result
+            job.status = "error" if "error" in result else "done"
+            elapsed = round(job.finished - job.started, 3)
+            job.publish(job.status, {"job_id": job.id, "elapsed_s": elapsed, **({"error": result["error"]} if job.status == "error" else {})})
+            self._running -= 1
+            self._queue.task_done()
+
+    # Runs in the executor; each section is handed to the event loop as soon
+    # as its agent finishes.
+    def _run(self, job, loop):
+        request = job.request
+        started = time.perf_counter()
+        for name, section in orchestrator_stream(request["project_input"], request["attachment"], request["api_key"],
+                                                 self.agent_workers, self.handle, mode=request["mode"]):
+            if name in ("error", "final"):
+                return section
+            loop.call_soon_threadsafe(job.publish, name,
+                                      {"section": name, "elapsed_s": round(time.perf_counter() - started, 3), "data": section})
+        return {"error": "Simulation ended without a result."}
+
+    def parse_request(self, body, headers):
+        """The job request in `body` (JSON), or raises ValueError with the reason."""
+        try:
+            payload = json.loads(body or b"{}")
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise ValueError(f"Request body is not valid JSON: {e}") from e
+        if not isinstance(payload, dict):
+            raise ValueError("Request body must be a JSON object.")
+        project_input = payload.get("project_input") or payload.get("description") or ""
+        if not isinstance(project_input, str) or not project_input.strip():
+            raise ValueError("Please provide a project description in \"project_input\".")
+        mode = payload.get("mode", "thorough")
+        if mode not in PIPELINES:
+            raise ValueError(f"Unknown simulation mode {mode!r}; choose one of {', '.join(PIPELINES)}.")
+        api_key = headers.get("x-gemini-api-key") or payload.get("api_key") or self.api_key
+        if self.handle is None and not str(api_key).strip():
+            raise ValueError("No Gemini API key provided. Send an X-Gemini-Api-Key header or start the service with --api-key.")
+        attachment = None
+        if payload.get("attachment"):
+            spec = payload["attachment"]
+            try:
+                data = base64.b64decode(spec["data"], validate=True)
+                attachment = attachment_store.load(UploadedBytes(data, spec.get("name", "attachment"), spec["mime_type"]))
+            except (KeyError, TypeError, binascii.Error) as e:
+                raise ValueError("\"attachment\" needs \"mime_type\" and base64 \"data\" fields.") from e
+        return {"project_input": project_input, "mode": mode, "api_key": str(api_key), "attachment": attachment}
+
+    def health(self):
+        return {
+            "queued": self._queue.qsize(),
+            "max_queued": self._queue.maxsize,
+            "running": self._running,
+            "workers": self.workers,
+            "jobs": len(self.jobs),
+            "api_keys": len(client_pool),
+            "response_cache": response_cache.stats(),
+            "attachments": attachment_store.stats(),
+        }
+
+    # ──────────────────────────────────────────────
+    async def handle_connection(self, reader, writer):
+        try:
+            try:
+                method, path, headers, body = await asyncio.wait_for(_read_request(reader), self.read_timeout)
+            except asyncio.TimeoutError:
+                raise _HTTPError(408, f"No complete request within {self.read_timeout}s.") from None
+            await self._route(method, path, headers, body, writer)
+        except _HTTPError as e:
+            await _send_json(writer, e.status, {"error": e.message})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, path, headers, body, writer):
+        parts = [p for p in urlsplit(path).path.split("/") if p]
+        if parts == ["health"]:
+            return await _send_json(writer, 200, self.health())
+        if parts == ["jobs"]:
+            if method != "POST":
+                raise _HTTPError(405, "Use POST to submit a job.")
+            # Turn a full queue away before decoding and spooling the attachment.
+            if self._queue.full():
+                return await _send_busy(writer)
+            try:
+                # Decoding and hashing an attachment is blocking work.
+                request = await asyncio.get_running_loop().run_in_executor(None, self.parse_request, body, headers)
+            except ValueError as e:  # includes AttachmentError
+                raise _HTTPError(400, str(e)) from e
+            try:
+                job = self.submit(request)
+            except asyncio.QueueFull:  # filled up while this request was parsed
+                return await _send_busy(writer)
+            return await _send_json(writer, 202, {"job_id": job.id, "status": job.status,
+                                                  "result": f"/jobs/{job.id}", "events": f"/jobs/{job.id}/events"})
+        if len(parts) in (2, 3) and parts[0] == "jobs" and (len(parts) == 2 or parts[2] == "events"):
+            if method != "GET":
+                raise _HTTPError(405, "Use GET to read a job.")
+            job = self.jobs.get(parts[1])
+            if job is None:
+                raise _HTTPError(404, f"No job {parts[1]}.")
+            if len(parts) == 2:
+                return await _send_json(writer, 200, job.describe())
+            return await self._stream_events(job, headers, writer)
+        raise _HTTPError(404, f"No route for {method} {path}.")
+
+    async def _stream_events(self, job, headers, writer):
+        # A reconnecting client sends Last-Event-ID and gets only what it missed.
+        try:
+            seen = int(headers.get("last-event-id", -1)) + 1
+        except ValueError:
+            seen = 0
+        writer.write(_head(200, {"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}))
+        while True:
+            for index in range(seen, len(job.events)):
+                event, data = job.events[index]
+                writer.write(f"id: {index}\nevent: {event}\ndata: {json.dumps(data)}\n\n".encode())
+            seen = len(job.events)
+            await writer.drain()
+            if job.done:
+                return
+            await job.wait(seen)
+
+
+class _HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# One line of the request head, counted against the bytes it has left.
+async def _read_line(reader, budget):
+    try:
+        line = await reader.readline()
+    except ValueError:  # a single line over StreamReader's 64KB limit
+        line = None
+    if line is None or len(line) > budget:
+        raise _HTTPError(431, f"Request line and headers are too large (over {MAX_HEADER_BYTES // 1024}KB).")
+    return line.decode("latin-1").strip(), budget - len(line)
+
+
+async def _read_request(reader):
+    request_line, budget = await _read_line(reader, MAX_HEADER_BYTES)
+    try:
+        method, path, _ = request_line.split(" ", 2)
+    except ValueError:
+        raise _HTTPError(400, "Malformed request line.") from None
+    headers = {}
+    while True:
+        line, budget = await _read_line(reader, budget)
+        if not line:
+            break
+        name, sep, value = line.partition(":")
+        if not sep or not name.strip():
+            raise _HTTPError(400, f"Malformed header line: {line[:80]!r}.")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise _HTTPError(400, "Invalid Content-Length.")
+    if length > MAX_BODY_BYTES:
+        raise _HTTPError(413, "Request body is too large (over 28MB); attachments are limited to 20MB.")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path, headers, body
+
+
+def _head(status, headers):
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", "Connection: close"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode()
+
+
+async def _send_json(writer, status, payload, headers=None):
+    body = json.dumps(payload).encode()
+    writer.write(_head(status, {"Content-Type": "application/json", "Content-Length": str(len(body)), **(headers or {})}))
+    writer.write(body)
+    await writer.drain()
+
+
+async def _send_busy(writer):
+    await _send_json(writer, 503, {"error": "Too many queued simulations; retry shortly."},
+                     {"Retry-After": str(RETRY_AFTER_SECONDS)})
+
+
+async def serve(host="127.0.0.1", port=8080, service=None, ready=None, **service_args):
+    """Run the service until cancelled. `ready`, if given, is set to the bound (host, port)."""
+    service = service or SimulationService(**service_args)
+    await service.start()
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    if ready is not None:
+        ready.set_result(server.sockets[0].getsockname()[:2])
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve Shadow TPM simulations over HTTP as queued jobs with server-sent progress events.")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on (default: 8080)")
+    parser.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY") or os.environ.get("GOOGLE_API_KEY", ""), help="Gemini API key for requests that don't send one (default: $GEMINI_API_KEY or $GOOGLE_API_KEY)")
+    parser.add_argument("-w", "--workers", type=int, default=2, help="simulations run at once (default: 2)")
+    parser.add_argument("-q", "--max-queued", type=int, default=16, help="jobs waiting beyond that before new ones get 503 (default: 16)")
+    parser.add_argument("--agent-workers", type=int, default=MAX_CONCURRENT_AGENTS, help=f"agents run in parallel within one job (default: {MAX_CONCURRENT_AGENTS})")
+    args = parser.parse_args(argv)
+
+    print(f"Serving on http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        asyncio.run(serve(args.host, args.port, api_key=args.api_key, workers=max(1, args.workers),
+                          max_queued=max(1, args.max_queued), agent_workers=args.agent_workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+
+
+class RunMetrics:
+    """Collects one record per model call made during a simulation run."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.calls = []
+        self.compaction = {}
+        self._lock = threading.Lock()
+
+    def record(self, agent, started, **fields):
+        call = {
+            "agent": agent,
+            "start_s": round(started - self.started, 4),
+            "wall_s": round(time.perf_counter() - started, 4),
+            **fields,
+        }
+        with self._lock:
+            self.calls.append(call)
+        return call
+
+    def record_compaction(self, agent, stats):
+        with self._lock:
+            self.compaction[agent] = stats
+
+    def summary(self):
+        with self._lock:
+            calls = sorted(self.calls, key=lambda c: c["start_s"])
+        agents = {}
+        for call in calls:
+            agent = agents.setdefault(call["agent"], {
+                "calls": 0, "wall_s": 0.0, "prompt_tokens": 0, "response_tokens": 0,
+                "retries": 0, "cache_hits": 0, "payload_bytes": 0, "fallbacks": 0, "over_budget": 0, "models": {},
+            })
+            agent["calls"] += 1
+            agent["wall_s"] = round(agent["wall_s"] + call["wall_s"], 4)
+            agent["prompt_tokens"] += call.get("prompt_tokens", 0)
+            agent["response_tokens"] += call.get("response_tokens", 0)
+            agent["retries"] += call.get("retries", 0)
+            agent["cache_hits"] += int(call.get("cache_hit", False))
+            agent["payload_bytes"] += call.get("payload_bytes", 0)
+            agent["fallbacks"] += len(call.get("fallbacks", []))
+            agent["over_budget"] += int(call.get("over_budget", False))
+            if call.get("model"):
+                agent["models"][call["model"]] = agent["models"].get(call["model"], 0) + 1
+        return {
+            "total_wall_s": round(time.perf_counter() - self.started, 4),
+            "agents": agents,
+            "calls": calls,
+            "compaction": dict(self.compaction),
+        }
+
+
+def payload_bytes(content):
+    parts = content if isinstance(content, list) else [content]
+    size = 0
+    for part in parts:
+        if isinstance(part, dict):
+            data = part.get("data", b"")
+            size += len(data) if isinstance(data, bytes) else len(str(data).encode())
+        else:
+            size += len(str(part).encode())
+    return size
+
+
+def usage_tokens(response):
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "prompt_token_count", 0) or 0, getattr(usage, "candidates_token_count", 0) or 0
+
+
+# ──────────────────────────────────────────────
+# Exporters. Set SHADOW_TPM_METRICS_LOG to append every call to a JSON-lines
+# file, then `python telemetry.py <file>` prints per-agent p50/p95 in the
+# Prometheus text format for scraping or a textfile collector.
+
+_log_lock = threading.Lock()
+
+
+def append_jsonl(path, metrics, **labels):
+    now = time.time()
+    with _log_lock, open(path, "a", encoding="utf-8") as f:
+        for call in metrics["calls"]:
+            f.write(json.dumps({"ts": now, **labels, **call}) + "\n")
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _quantile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = q * (len(ordered) - 1)
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def agent_percentiles(calls):
+    by_agent = defaultdict(list)
+    for call in calls:
+        by_agent[call["agent"]].append(call)
+    stats = {}
+    for agent, records in sorted(by_agent.items()):
+        walls = [r["wall_s"] for r in records if not r.get("cache_hit")]
+        stats[agent] = {
+            "count": len(records),
+            "cache_hits": sum(1 for r in records if r.get("cache_hit")),
+            "p50_s": round(_quantile(walls, 0.5), 4),
+            "p95_s": round(_quantile(walls, 0.95), 4),
+            "wall_s_sum": round(sum(walls), 4),
+            "prompt_tokens": sum(r.get("prompt_tokens", 0) for r in records),
+            "response_tokens": sum(r.get("response_tokens", 0) for r in records),
+            "retries": sum(r.get("retries", 0) for r in records),
+            "fallbacks": sum(len(r.get("fallbacks", [])) for r in records),
+        }
+    return stats
+
+
+def prometheus_text(calls):
+    stats = agent_percentiles(calls)
+    lines = [
+        "# HELP shadow_tpm_agent_latency_seconds Model call wall time per agent (cache misses only).",
+        "# TYPE shadow_tpm_agent_latency_seconds summary",
+    ]
+    for agent, s in stats.items():
+        lines.append(f'shadow_tpm_agent_latency_seconds{{agent="{agent}",quantile="0.5"}} {s["p50_s"]}')
+        lines.append(f'shadow_tpm_agent_latency_seconds{{agent="{agent}",quantile="0.95"}} {s["p95_s"]}')
+        lines.append(f'shadow_tpm_agent_latency_seconds_sum{{agent="{agent}"}} {s["wall_s_sum"]}')
+        lines.append(f'shadow_tpm_agent_latency_seconds_count{{agent="{agent}"}} {s["count"] - s["cache_hits"]}')
+    for name, key, help_text in (
+        ("shadow_tpm_agent_calls_total", "count", "Model calls per agent, including cache hits."),
+        ("shadow_tpm_agent_cache_hits_total", "cache_hits", "Calls answered from the response cache."),
+        ("shadow_tpm_agent_prompt_tokens_total", "prompt_tokens", "Prompt tokens billed per agent."),
+        ("shadow_tpm_agent_response_tokens_total", "response_tokens", "Response tokens billed per agent."),
+        ("shadow_tpm_agent_retries_total", "retries", "Retried model calls per agent."),
+        ("shadow_tpm_agent_fallbacks_total", "fallbacks", "Calls moved to a faster model (latency budget or quota)."),
+    ):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for agent, s in stats.items():
+            lines.append(f'{name}{{agent="{agent}"}} {s[key]}')
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("SHADOW_TPM_METRICS_LOG", "")
+    if not path:
+        sys.exit("usage: python telemetry.py <metrics.jsonl>")
+    sys.stdout.write(prometheus_text(read_jsonl(path)))
@@ -0,0 +1,27 @@
+import itertools
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import FakeBackend, constant  # noqa: E402
+from clients import ModelHandle  # noqa: E402
+from ratelimit import RateLimiter  # noqa: E402
+
+_unique = itertools.count()
+
+
+def stub_handle(latency=0.0, **backend_options):
+    """A ModelHandle on FakeBackend with a fixed latency per call and no
+    quota waits, so timings only depend on how calls are scheduled."""
+    backend = FakeBackend(latency=constant(latency) if latency else None, **backend_options)
+    return ModelHandle(backend, RateLimiter(rpm=1e9, tpm=1e12, base_delay=0.01))
+
+
+@pytest.fixture
+def program():
+    # A fresh description per call, so the process-wide response cache and
+    # stage memo never answer for a test.
+    return lambda label="test": f"Test program {label}-{os.getpid()}-{next(_unique)}: scale a 1GW TPU cluster, 9-month deadline."
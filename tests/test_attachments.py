@@ -0,0 +1,51 @@
+import tracemalloc
+
+import pytest
+
+from attachments import Attachment, AttachmentStore, chunk_text
+from batch import LocalFile
+
+FILLER = "Weekly status: build green, no change to staffing or budget this sprint.\n\n"
+NEEDLE = "The transformer vendor has slipped delivery by six weeks."
+
+
+@pytest.fixture
+def document(tmp_path):
+    path = tmp_path / "plan.txt"
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(40000):  # about 3MB
+            f.write(NEEDLE + "\n\n" if i == 25000 else FILLER)
+    return LocalFile(str(path))
+
+
+def test_extracted_text_is_spooled_not_held_in_memory(document):
+    store = AttachmentStore()
+    tracemalloc.start()
+    attachment = store.load(document)
+    resident, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert attachment.has_text and attachment.text_chars > 2_500_000
+    assert resident < attachment.text_chars / 10
+    store.clear()
+
+
+def test_excerpt_reads_back_the_relevant_chunk(document):
+    store = AttachmentStore()
+    attachment = store.load(document)
+    excerpt = attachment.excerpt("transformer vendor delivery slip", 2000)
+    assert NEEDLE in excerpt and len(excerpt) <= 2000
+    assert "".join(attachment.iter_chunks()).count(NEEDLE) == 1
+    store.clear()
+
+
+def test_failed_extraction_keeps_no_partial_text():
+    def chunks():
+        yield from chunk_text(["first paragraph", "second paragraph"], size=20)
+        raise ValueError("corrupt page")
+
+    attachment = Attachment("doc.pdf", "application/pdf", "0" * 64, 0, None)
+    with pytest.raises(ValueError):
+        attachment.add_chunks(chunks())
+    assert not attachment.has_text and attachment.text_chars == 0
+    attachment.add_chunks(["recovered"])
+    assert list(attachment.iter_chunks()) == ["recovered"]
@@ -0,0 +1,20 @@
+import time
+
+import pytest
+
+from agents import orchestrator
+from backends import FakeBackend, make_backend
+
+
+@pytest.mark.parametrize("latency", ["0", "-1"])
+def test_fake_backend_without_latency_answers_at_once(monkeypatch, program, latency):
+    monkeypatch.setenv("SHADOW_TPM_BACKEND", "fake")
+    monkeypatch.setenv("SHADOW_TPM_FAKE_LATENCY", latency)
+    monkeypatch.setenv("SHADOW_TPM_RPM", "1e9")
+    api_key = f"no-latency{latency}"
+    assert isinstance(make_backend(api_key), FakeBackend)
+
+    started = time.perf_counter()
+    result = orchestrator(program("no-latency"), user_api_key=api_key)
+    assert time.perf_counter() - started < 2
+    assert result["risks"] and not any("error" in section for section in result.values() if isinstance(section, dict))
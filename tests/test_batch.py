@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+import batch
+
+
+@pytest.fixture
+def api_key(monkeypatch, tmp_path):
+    # Clients and their rate limiters are shared per key, so each test gets
+    # its own key and no request-rate limit.
+    monkeypatch.setenv("SHADOW_TPM_BACKEND", "fake")
+    monkeypatch.setenv("SHADOW_TPM_FAKE_LATENCY", "0")
+    monkeypatch.setenv("SHADOW_TPM_RPM", "1e9")
+    return str(tmp_path)
+
+
+def write_programs(path, program, ids):
+    path.write_text("".join(json.dumps({"id": i, "description": program(i)}) + "\n" for i in ids))
+
+
+def records(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def run(programs, output, api_key, **options):
+    return batch.run_batch(str(programs), str(output), api_key, concurrency=2, log=lambda msg: None, **options)
+
+
+def test_partial_line_from_an_interrupted_run_is_replaced(api_key, tmp_path, program):
+    programs, output = tmp_path / "programs.jsonl", tmp_path / "results.jsonl"
+    write_programs(programs, program, ["a", "b"])
+    output.write_text(json.dumps({"id": "a", "result": {}}) + "\n" + '{"id": "b", "resu')
+
+    summary = run(programs, output, api_key)
+    assert summary["programs"] == 1
+    assert [record["id"] for record in records(output)] == ["a", "b"]
+    assert "result" in records(output)[1]
+
+
+def test_failed_programs_are_retried_unless_skipped(api_key, tmp_path, program):
+    programs, output = tmp_path / "programs.jsonl", tmp_path / "results.jsonl"
+    write_programs(programs, program, ["ok", "failed"])
+    output.write_text(json.dumps({"id": "ok", "result": {}}) + "\n" + json.dumps({"id": "failed", "error": "quota"}) + "\n")
+
+    assert run(programs, output, api_key, skip_errors=True)["programs"] == 0
+    assert run(programs, output, api_key)["programs"] == 1
+    assert "result" in records(output)[-1] and records(output)[-1]["id"] == "failed"
+    assert run(programs, output, api_key)["programs"] == 0
+
+
+def test_truncate_partial_line_keeps_complete_files(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_bytes(b"")
+    batch.truncate_partial_line(str(path))
+    assert path.read_bytes() == b""
+
+    path.write_bytes(b"x" * 100)
+    batch.truncate_partial_line(str(path), block=7)
+    assert path.read_bytes() == b""
+
+    path.write_bytes(b"one\n" + b"x" * 100)
+    batch.truncate_partial_line(str(path), block=7)
+    assert path.read_bytes() == b"one\n"
+
+    batch.truncate_partial_line(str(path))
+    assert path.read_bytes() == b"one\n"
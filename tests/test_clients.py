@@ -0,0 +1,39 @@
+from backends import FakeBackend
+from clients import ClientPool, ModelHandle
+
+
+class ClosingBackend(FakeBackend):
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def pool(max_size=1):
+    return ClientPool(max_size, factory=lambda api_key: ModelHandle(ClosingBackend(model_name=api_key)))
+
+
+def test_evicted_handle_is_closed():
+    clients = pool()
+    with clients.lease("a") as a:
+        pass
+    with clients.lease("a") as again:
+        assert again is a
+    with clients.lease("b") as b:
+        assert a.backend.closed and not b.backend.closed
+    assert len(clients) == 1
+
+
+def test_leased_handle_is_closed_only_after_its_last_lease():
+    clients = pool()
+    with clients.lease("a") as a:
+        with clients.lease("a"):
+            with clients.lease("b"):
+                pass
+        assert not a.backend.closed  # evicted, but a simulation still runs on it
+        assert a.generate_content("Any prompt").text
+    assert a.backend.closed
+
+    # A fresh handle is made for the key once its old one was evicted.
+    with clients.lease("a") as fresh:
+        assert fresh is not a and not fresh.backend.closed
@@ -0,0 +1,81 @@
+import json
+import re
+
+import pytest
+
+from agents import orchestrator
+from compaction import EXPLANATION_CHARS, OPTIONS_PER_RISK_FOR_COMMS, expand_risk_ids, project_risks, project_tradeoffs
+from conftest import stub_handle
+from schemas import AGENT_SCHEMAS, conform
+
+DOWNSTREAM_AGENTS = ("trade_off_optimizer", "ethics_checker", "talent_risk_simulator", "comms_influencer")
+
+
+@pytest.fixture(scope="module")
+def result():
+    handle = stub_handle(num_risks=6, options_per_risk=4).bind(use_cache=False)
+    return orchestrator("Compaction test program: scale a 1GW TPU cluster, 9-month deadline.", handle=handle)
+
+
+@pytest.mark.parametrize("agent", DOWNSTREAM_AGENTS)
+def test_projected_risks_keep_the_fields_prompts_reference(result, agent):
+    risks = result["risks"]
+    projected = project_risks({"risks": risks}, agent)
+    assert [r["id"] for r in projected] == [f"R{i}" for i in range(1, len(risks) + 1)]
+    for original, compact in zip(risks, projected):
+        assert {k: compact[k] for k in ("risk", "probability", "impact")} == {k: original[k] for k in ("risk", "probability", "impact")}
+        assert ("explanation" in compact) == bool(EXPLANATION_CHARS[agent])
+
+
+def test_projected_tradeoffs_keep_the_option_fields(result):
+    risks_data = {"risks": result["risks"]}
+    projected = project_tradeoffs({"tradeoffs": result["tradeoffs"]}, risks_data)
+    ids = {r["risk"]: r["id"] for r in project_risks(risks_data, "comms_influencer")}
+    assert len(projected) == len(result["tradeoffs"])
+    for original, compact in zip(result["tradeoffs"], projected):
+        assert compact["risk_id"] == ids[original["risk"]]
+        assert 0 < len(compact["options"]) <= OPTIONS_PER_RISK_FOR_COMMS
+        by_name = {o["option"]: o for o in original["options"]}
+        for option in compact["options"]:
+            assert set(option) == {"option", "time_impact", "quality_risk_reduction"}
+            assert all(option[k] == by_name[option["option"]][k] for k in option)
+
+
+def test_every_agent_output_conforms_to_its_schema(result):
+    assert "error" not in result
+    sections = {
+        "risk_forecaster": {"risks": result["risks"]},
+        "trade_off_optimizer": {"tradeoffs": result["tradeoffs"]},
+        "comms_influencer": result["comms"],
+        "ethics_checker": result["ethics"],
+        "talent_risk_simulator": result["talent"],
+    }
+    for agent, section in sections.items():
+        _, problems = conform(json.loads(json.dumps(section)), AGENT_SCHEMAS[agent])
+        assert not problems, (agent, problems)
+
+
+def _strings(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        yield from (s for v in value.values() for s in _strings(v))
+    elif isinstance(value, list):
+        yield from (s for v in value for s in _strings(v))
+
+
+def test_rendered_outputs_name_risks_instead_of_ids(result):
+    # The fake cites risks by id in notes and talking points, as models do.
+    texts = list(_strings([result["tradeoffs"], result["comms"]]))
+    assert not [t for t in texts if re.search(r"\bR\d+\b", t)]
+    names = {r["risk"] for r in result["risks"]}
+    assert any(f'"{name}"' in t for t in texts for name in names)
+
+
+def test_expand_risk_ids():
+    risks_data = {"risks": [{"risk": "Vendor slip"}, {"risk": "Fiber shortfall"}]}
+    data = {"risk": "R2", "note": "Also reduces R1 and R2; see R9 and GR1."}
+    assert expand_risk_ids(data, risks_data) == {
+        "risk": "Fiber shortfall",
+        "note": 'Also reduces "Vendor slip" and "Fiber shortfall"; see R9 and GR1.',
+    }
@@ -0,0 +1,98 @@
+import pytest
+
+from history import HistoryStore, fingerprint
+
+
+def result(*risks, mode="thorough"):
+    """A final_output with the given (risk, probability, impact) rows."""
+    return {
+        "mode": mode,
+        "summary": "Two risks dominate.",
+        "risks": [{"risk": r, "probability": p, "impact": i, "explanation": f"Why {r}", "owner": "infra"}
+                  for r, p, i in risks],
+        "tradeoffs": [{"risk": risks[0][0], "options": [
+            {"option": "Dual-source", "effort_impact": "High", "time_impact": "+2 weeks",
+             "quality_risk_reduction": "Removes the single vendor", "multi_risk_note": "Also eases power"},
+            {"option": "Buffer stock", "effort_impact": "Low", "time_impact": "None",
+             "quality_risk_reduction": "Covers one quarter"},
+        ]}],
+        "comms": {
+            "email_draft": {"subject": "Status", "greeting": "Hi all", "body": "We are on track.", "closing": "Thanks"},
+            "talking_points": ["Vendor risk is covered", "Power is the open item"],
+            "slide_outline": {"title": "Cluster status", "bullets": ["On track", "Two open risks"]},
+            "tone": "calm",
+        },
+        "ethics": {"concerns": [{"concern": "Water use", "severity": "Medium", "explanation": "Cooling"}],
+                   "mitigations": [{"mitigation": "Dry cooling", "benefit": "Less water"}]},
+        "talent": {},
+        "metrics": {"total_latency_s": 1.5},
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    history = HistoryStore(str(tmp_path / "history.db"))
+    yield history
+    history.close()
+
+
+def test_saved_run_loads_back_unchanged(store):
+    saved = result(("Chip supply slips", "40%", "High"), ("Power delivery late", "10-20%", "Medium"))
+    run_id = store.save(saved, "Scale the cluster", label="baseline", attachment="ab" * 32)
+
+    loaded, project_input, attachment = store.load(run_id)
+    assert loaded == saved
+    assert project_input == "Scale the cluster" and attachment == "ab" * 32
+    assert store.load(run_id + 1) is None
+    assert store.stats() == {"runs": 1, "programs": 1}
+
+    store.delete(run_id)
+    assert store.load(run_id) is None
+
+
+def test_search_filters_on_text_impact_and_probability(store):
+    supply = store.save(result(("Chip supply slips", "60%", "High")), "Scale the cluster")
+    power = store.save(result(("Power delivery late", "30%", "Medium")), "Build the substation", label="50% done")
+
+    def ids(**filters):
+        return [row["id"] for row in store.search(**filters)]
+
+    assert ids() == [power, supply]
+    assert ids(query="chip SUPPLY") == [supply]
+    assert ids(query="substation") == [power]
+    # Wildcards in the query are matched literally.
+    assert ids(query="50%") == [power]
+    assert ids(query="_") == []
+    assert ids(impact="High") == [supply]
+    assert ids(min_probability=50) == [supply]
+    assert ids(impact="Medium", min_probability=50) == []
+
+    row = store.search(query="chip")[0]
+    assert (row["risks"], row["high_risks"], row["fingerprint"]) == (1, 1, fingerprint("Scale the cluster"))
+
+
+def test_trend_groups_runs_of_the_same_program(store):
+    first = store.save(result(("Chip supply slips", "60%", "High"), ("Power delivery late", "20%", "Low")),
+                       "Scale the  cluster")
+    store.save(result(("Unrelated", "90%", "High")), "Another program")
+    second = store.save(result(("Chip supply slips", "30%", "Medium")), "scale the cluster")
+
+    trend = store.trend(fingerprint("Scale the cluster"))
+    assert [run["id"] for run in trend["runs"]] == [first, second]
+    assert trend["runs"][0]["mean_probability"] == pytest.approx(40)
+    assert (trend["runs"][0]["High"], trend["runs"][0]["Low"], trend["runs"][1]["Medium"]) == (1, 1, 1)
+    assert [(row["run_id"], row["probability"]) for row in trend["risks"]] == [(first, 60), (first, 20), (second, 30)]
+    assert store.trend(fingerprint("Never run")) == {"runs": [], "risks": []}
+
+
+def test_unused_risk_text_index_is_dropped(tmp_path):
+    path = str(tmp_path / "old.db")
+    HistoryStore(path).close()
+    store = HistoryStore(path)
+    store._db.execute("CREATE INDEX risks_risk ON risks (risk)")
+    store.close()
+
+    store = HistoryStore(path)
+    indexes = {row[0] for row in store._db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    store.close()
+    assert "risks_risk" not in indexes and "risks_impact" in indexes
@@ -0,0 +1,39 @@
+import math
+
+import pytest
+
+from normalize import option_frame, parse_percent, parse_probability
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("65%", 65.0),
+    ("65-70%", 67.5),
+    ("20–30%", 25.0),
+    ("20% to 30%", 25.0),
+    ("-5%", -5.0),
+    ("+15%", 15.0),
+    ("about 40%", 40.0),
+])
+def test_percent(text, expected):
+    assert parse_percent([text])[0] == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("65-70%", 67.5),
+    ("0.65", 65.0),
+    ("1.0", 100.0),
+    ("1", 1.0),
+    ("65", 65.0),
+    ("0.6-0.7", 65.0),
+])
+def test_probability(text, expected):
+    assert parse_probability([text])[0] == pytest.approx(expected)
+
+
+def test_unparseable_values_are_nan():
+    assert all(math.isnan(v) for v in parse_probability(["High", None, ""]))
+
+
+def test_range_is_not_a_negative_reduction():
+    options = option_frame([{"risk": "r", "options": [{"option": "o", "quality_risk_reduction": "20-30%"}]}])
+    assert options["risk_reduction_pct"][0] == pytest.approx(25.0)
@@ -0,0 +1,43 @@
+import time
+
+import pytest
+
+from agents import PIPELINE, SECTIONS, orchestrator, run_pipeline
+from conftest import stub_handle
+
+LATENCY = 0.2
+
+
+def timed_run(max_workers, project_input):
+    handle = stub_handle(LATENCY).bind(use_cache=False)
+    started = time.perf_counter()
+    stages = run_pipeline(handle, project_input, max_workers=max_workers)
+    elapsed = time.perf_counter() - started
+    assert "error" not in stages and set(stages) == set(PIPELINE)
+    return elapsed
+
+
+def test_parallel_run_takes_the_critical_path(program):
+    # risks -> ethics | tradeoffs | talent -> comms: three calls deep.
+    elapsed = timed_run(3, program("parallel"))
+    assert elapsed == pytest.approx(3 * LATENCY, abs=0.15)
+
+
+def test_serial_run_takes_every_call(program):
+    elapsed = timed_run(1, program("serial"))
+    assert elapsed == pytest.approx(5 * LATENCY, abs=0.15)
+
+
+@pytest.mark.parametrize("mode, section", [("thorough", "comms"), ("thorough", "ethics"), ("fast", "comms")])
+def test_regenerate_calls_the_model_once_for_that_section(program, mode, section):
+    # use_cache=False stands in for a restarted process or a run reloaded
+    # from history: nothing upstream is in the stage memo or response cache.
+    handle = stub_handle().bind(use_cache=False)
+    project_input = program("regenerate")
+    first = orchestrator(project_input, handle=handle, mode=mode)
+    calls = handle.backend.calls
+
+    second = orchestrator(project_input, handle=handle, mode=mode, regenerate=(section,), previous=first)
+    assert "error" not in second
+    assert handle.backend.calls - calls == 1
+    assert {name: second[name] for name in SECTIONS if name != section} == {name: first[name] for name in SECTIONS if name != section}
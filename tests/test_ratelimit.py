@@ -0,0 +1,94 @@
+import time
+
+import pytest
+from google.api_core import exceptions as api_exceptions
+
+from backends import GeminiBackend
+from ratelimit import CircuitBreaker, QuotaExhaustedError, RateLimiter, retry_after
+
+
+def limiter(**options):
+    return RateLimiter(rpm=1e9, tpm=1e12, **options)
+
+
+def raising(error):
+    def call():
+        raise error
+    return call
+
+
+@pytest.mark.parametrize("message, seconds", [
+    ("429 Quota exceeded. Please retry in 12.5s.", 12.5),
+    ("429 Resource exhausted [retry_delay {\n  seconds: 30\n}]", 30.0),
+    ("503 Unavailable; Retry-After: 7", 7.0),
+    ("503 The model is overloaded.", None),
+])
+def test_retry_after_hints(message, seconds):
+    assert retry_after(Exception(message)) == seconds
+
+
+def test_backoff_follows_the_hint_with_jitter_and_cap():
+    rate_limiter = limiter(base_delay=0.5, max_delay=20.0)
+    for _ in range(50):
+        assert 12.5 <= rate_limiter.backoff(0, Exception("retry in 12.5s")) <= 13.0
+        assert 20.0 <= rate_limiter.backoff(0, Exception("retry in 90s")) <= 20.5
+
+
+def test_backoff_without_a_hint_is_exponential_and_capped():
+    rate_limiter = limiter(base_delay=0.5, max_delay=3.0)
+    for attempt, ceiling in [(0, 0.5), (1, 1.0), (2, 2.0), (5, 3.0)]:
+        assert all(0 <= rate_limiter.backoff(attempt) <= ceiling for _ in range(50))
+
+
+def test_call_retries_transient_errors_then_gives_up():
+    failures = iter([api_exceptions.ServiceUnavailable("503"), api_exceptions.ServiceUnavailable("503")])
+
+    def flaky():
+        error = next(failures, None)
+        if error:
+            raise error
+        return "ok"
+
+    assert limiter(base_delay=0.001).call(flaky) == ("ok", 2)
+    with pytest.raises(api_exceptions.ServiceUnavailable):
+        limiter(max_retries=1, base_delay=0.001).call(raising(api_exceptions.ServiceUnavailable("503")))
+
+
+def test_breaker_opens_then_lets_one_trial_call_through():
+    breaker = CircuitBreaker(threshold=2, cooldown=0.05)
+    breaker.record_failure()
+    breaker.check()  # one failure: still closed
+    breaker.record_failure()
+    assert breaker.is_open
+    with pytest.raises(QuotaExhaustedError):
+        breaker.check()
+
+    time.sleep(0.06)
+    breaker.check()  # half-open
+    assert not breaker.is_open
+    breaker.record_failure()  # the trial failed: open again straight away
+    with pytest.raises(QuotaExhaustedError):
+        breaker.check()
+
+    time.sleep(0.06)
+    breaker.check()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.check()  # the count was reset, so one failure no longer opens it
+
+
+def test_daily_quota_opens_the_breaker_at_once():
+    rate_limiter = limiter(breaker_threshold=5, base_delay=0.001)
+    with pytest.raises(QuotaExhaustedError):
+        rate_limiter.call(raising(api_exceptions.ResourceExhausted("Quota exceeded per day")))
+    assert rate_limiter.breaker.is_open
+
+
+def test_gemini_backend_disables_client_retries(monkeypatch):
+    backend = GeminiBackend("test-key")
+    seen = []
+    monkeypatch.setattr(backend.model, "generate_content", lambda content, **kwargs: seen.append(kwargs))
+    backend.generate_content("hi", timeout=15)
+    backend.generate_content("hi", schema={"type": "object"})
+    assert seen[0]["request_options"] == {"retry": None, "timeout": 15}
+    assert seen[1]["request_options"] == {"retry": None}
@@ -0,0 +1,104 @@
+import pytest
+from google.api_core import exceptions as api_exceptions
+
+from agents import _generate, iter_pipeline
+from backends import FakeBackend, constant
+from clients import ModelHandle
+from ratelimit import RateLimiter
+from routing import DEFAULT_ROUTES, LatencyBudgetExceeded, Router
+
+
+class OutOfQuota(FakeBackend):
+    """FakeBackend that answers with a daily-quota error while `exhausted`."""
+
+    exhausted = True
+
+    def generate_content(self, content, schema=None, timeout=None):
+        if self.exhausted:
+            raise api_exceptions.ResourceExhausted("Quota exceeded per day")
+        return super().generate_content(content, schema, timeout)
+
+
+class RateLimited(FakeBackend):
+    """FakeBackend whose every call is refused with a 429."""
+
+    def generate_content(self, content, schema=None, timeout=None):
+        self.calls += 1
+        raise api_exceptions.ResourceExhausted("Resource has been exhausted (e.g. check quota).")
+
+
+def routed_handle():
+    backends = {}
+
+    def factory(model_name):
+        backend_class = OutOfQuota if model_name == "strong-model" else FakeBackend
+        return backends.setdefault(model_name, backend_class(model_name=model_name))
+
+    # No retries and no circuit-breaker cooldown, so the strong model is
+    # asked again as soon as its quota is back.
+    def limiter():
+        return RateLimiter(rpm=1e9, tpm=1e12, max_retries=0, breaker_cooldown=0)
+
+    router = Router(tiers={"strong": "strong-model", "standard": "standard-model", "fast": "fast-model"},
+                    routes={agent: {"tier": "strong"} for agent in DEFAULT_ROUTES})
+    handle = ModelHandle(factory("strong-model"), limiter(), router=router, backend_factory=factory, limiter_factory=limiter)
+    return handle, backends
+
+
+def run(handle, project_input):
+    stage_info = {}
+    stages = dict(iter_pipeline(handle, project_input, stage_info=stage_info))
+    assert not any("error" in result for result in stages.values())
+    return stage_info
+
+
+def test_fallback_answers_are_not_memoized_under_the_primary_model(program):
+    handle, backends = routed_handle()
+    project_input = program("fallback")
+
+    first = run(handle, project_input)
+    assert backends["standard-model"].calls > 0
+
+    # The strong model is back: the next run must ask it, not reuse the
+    # standard model's answers.
+    backends["strong-model"].exhausted = False
+    second = run(handle, project_input)
+    assert not any(info["reused"] for info in second.values())
+    assert backends["strong-model"].calls > 0
+    assert {name: info["fingerprint"] for name, info in first.items()} == {name: info["fingerprint"] for name, info in second.items()}
+
+    # Answers from the primary model are memoized as before.
+    third = run(handle, project_input)
+    assert all(info["reused"] for info in third.values())
+
+
+def test_single_candidate_route_is_held_to_its_budget(program):
+    backend = FakeBackend(model_name="fast-model", latency=constant(5.0))
+    router = Router(tiers={"fast": "fast-model"},
+                    routes={"risk_forecaster": {"tier": "fast", "latency_budget_s": 0.05}})
+    handle = ModelHandle(backend, RateLimiter(rpm=1e9, tpm=1e12, max_retries=0), router=router,
+                         backend_factory=lambda model_name: backend)
+
+    assert router.candidates("risk_forecaster") == [("fast-model", 0.05)]
+    with pytest.raises(LatencyBudgetExceeded):
+        _generate(handle, program("budget"), "risk_forecaster")
+
+
+def test_quota_error_falls_back_without_retrying(program):
+    backends = {}
+
+    def factory(model_name):
+        backend_class = RateLimited if model_name == "strong-model" else FakeBackend
+        return backends.setdefault(model_name, backend_class(model_name=model_name))
+
+    # Retries are allowed; a 429 must still go straight to the fallback.
+    def limiter():
+        return RateLimiter(rpm=1e9, tpm=1e12, max_retries=4, base_delay=5.0)
+
+    router = Router(tiers={"strong": "strong-model", "standard": "standard-model"},
+                    routes={"risk_forecaster": {"tier": "strong"}})
+    handle = ModelHandle(factory("strong-model"), limiter(), router=router, backend_factory=factory, limiter_factory=limiter)
+
+    _generate(handle, program("quota"), "risk_forecaster")
+    assert backends["strong-model"].calls == 1
+    assert backends["standard-model"].calls == 1
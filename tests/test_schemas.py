@@ -0,0 +1,61 @@
+import pytest
+
+from schemas import AGENT_SCHEMAS, RISKS_SCHEMA, conform, parse_response, repair_json
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('```json\n{"a": 1}\n```', {"a": 1}),
+    ('Here you go:\n```\n{"a": [1, 2]}\n```\nThanks', {"a": [1, 2]}),
+    ('Sure! {"a": 1} Hope that helps.', {"a": 1}),
+    ('{"a": [1, 2, ], "b": {"c": 3,},}', {"a": [1, 2], "b": {"c": 3}}),
+    ('{"a": [1, 2]]}', {"a": [1, 2]}),
+])
+def test_repair_fences_prose_and_commas(text, expected):
+    assert repair_json(text) == expected
+
+
+def test_repair_leaves_commas_inside_strings_alone():
+    text = '{"note": "a, ]", "risks": ["x, }", "y",], }'
+    assert repair_json(text) == {"note": "a, ]", "risks": ["x, }", "y"]}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"risks": [{"risk": "Vendor sl', {"risks": [{"risk": "Vendor sl"}]}),
+    ('{"risks": [{"risk": "a"}, {"risk": "b", "impact": ', {"risks": [{"risk": "a"}, {"risk": "b"}]}),
+    ('{"risks": [{"risk": "a", "imp', {"risks": [{"risk": "a"}]}),
+    ('{"risks": ["a", ', {"risks": ["a"]}),
+])
+def test_repair_truncated_output(text, expected):
+    assert repair_json(text) == expected
+
+
+@pytest.mark.parametrize("text", [None, "", "no json here"])
+def test_repair_gives_up_on_non_json(text):
+    with pytest.raises(ValueError):
+        repair_json(text)
+
+
+def test_conform_coerces_types_and_shapes():
+    data = {"risks": {"risk": "Vendor slip", "probability": 0.4, "impact": "High"}}
+    conformed, problems = conform(data, RISKS_SCHEMA)
+    assert problems == []
+    assert conformed == {"risks": [{"risk": "Vendor slip", "probability": "0.4", "impact": "High", "explanation": ""}]}
+
+
+@pytest.mark.parametrize("value, expected", [("high", "High"), (" MEDIUM ", "Medium"), ("Severe", "High"),
+                                             ("moderate", "Medium"), ("negligible", "Low")])
+def test_conform_matches_enum_values(value, expected):
+    risk = {"risk": "r", "probability": "10%", "impact": value, "explanation": ""}
+    conformed, problems = conform({"risks": [risk]}, RISKS_SCHEMA)
+    assert problems == [] and conformed["risks"][0]["impact"] == expected
+
+
+def test_conform_reports_values_outside_an_enum():
+    concern = {"concern": "c", "severity": "Catastrophic", "explanation": ""}
+    _, problems = conform({"concerns": [concern], "mitigations": []}, AGENT_SCHEMAS["ethics_checker"])
+    assert problems == ["$.concerns[0].severity: 'Catastrophic' is not one of High, Medium, Low"]
+
+
+def test_parse_response_rejects_missing_top_level_keys():
+    parsed, problem = parse_response('{"talking_points": []}', AGENT_SCHEMAS["comms_influencer"])
+    assert parsed is None and "$.email_draft: missing" in problem
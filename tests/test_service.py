@@ -0,0 +1,112 @@
+import asyncio
+import base64
+import contextlib
+import http.client
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from agents import PIPELINES, attachment_store
+from conftest import stub_handle
+from service import serve
+
+
+@contextlib.contextmanager
+def running_service(**service_args):
+    """serve() on an ephemeral port in a background loop; yields (host, port)."""
+    loop = asyncio.new_event_loop()
+    ready = loop.create_future()
+    task = loop.create_task(serve("127.0.0.1", 0, ready=ready, **service_args))
+    thread = threading.Thread(target=loop.run_until_complete, args=(asyncio.wait([task]),), daemon=True)
+    thread.start()
+
+    async def address():
+        return await ready
+
+    try:
+        yield asyncio.run_coroutine_threadsafe(address(), loop).result(10)
+    finally:
+        loop.call_soon_threadsafe(task.cancel)
+        thread.join(10)
+        loop.close()
+
+
+def request(address, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection(*address, timeout=30)
+    connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers or {})
+    response = connection.getresponse()
+    return response.status, dict(response.getheaders()), response.read()
+
+
+def events(address, job_id):
+    status, headers, body = request(address, "GET", f"/jobs/{job_id}/events")
+    assert status == 200 and headers["Content-Type"] == "text/event-stream"
+    return [line[len("event: "):] for line in body.decode().splitlines() if line.startswith("event: ")]
+
+
+def test_job_streams_sections_between_started_and_done(program):
+    with running_service(handle=stub_handle(0.02), workers=1) as address:
+        status, _, body = request(address, "POST", "/jobs", {"project_input": program("service")})
+        assert status == 202
+        job_id = json.loads(body)["job_id"]
+
+        names = events(address, job_id)
+        sections = list(PIPELINES["thorough"])
+        assert names[:2] == ["queued", "started"]
+        assert sorted(names[2:-1]) == sorted(sections) and len(sections) == 5
+        assert names[-1] == "done"
+
+        status, _, body = request(address, "GET", f"/jobs/{job_id}")
+        job = json.loads(body)
+        assert status == 200 and job["status"] == "done"
+        assert set(sections) <= set(job["result"])
+
+
+def test_full_queue_is_rejected_before_the_attachment_is_read(program):
+    attachment = {"name": "plan.txt", "mime_type": "text/plain",
+                  "data": base64.b64encode(program("attachment").encode()).decode()}
+    # One slow job runs and one waits; the queue is then full.
+    with running_service(handle=stub_handle(0.3), workers=1, max_queued=1) as address:
+        running = json.loads(request(address, "POST", "/jobs", {"project_input": program("busy")})[2])["job_id"]
+        while json.loads(request(address, "GET", f"/jobs/{running}")[2])["status"] == "queued":
+            time.sleep(0.01)
+        queued, _, _ = request(address, "POST", "/jobs", {"project_input": program("busy")})
+        misses = attachment_store.stats()["misses"]
+        status, headers, body = request(address, "POST", "/jobs", {"project_input": program("busy"), "attachment": attachment})
+
+    assert queued == 202
+    assert status == 503 and headers["Retry-After"].isdigit()
+    assert "error" in json.loads(body)
+    assert attachment_store.stats()["misses"] == misses
+
+
+def raw_request(address, data):
+    """Send raw bytes and return the response's status code (None if the
+    server closed without one)."""
+    with socket.create_connection(address, timeout=10) as connection:
+        connection.sendall(data)
+        status_line = connection.makefile("rb").readline()
+    return int(status_line.split()[1]) if status_line else None
+
+
+def test_idle_client_is_timed_out():
+    with running_service(handle=stub_handle(), read_timeout=0.2) as address:
+        started = time.perf_counter()
+        assert raw_request(address, b"GET /health HTTP/1.1\r\n") == 408
+        assert time.perf_counter() - started < 5
+        status, _, _ = request(address, "GET", "/health")
+    assert status == 200
+
+
+@pytest.mark.parametrize("head", [
+    b"GET /health HTTP/1.1\r\nX-Padding: " + b"x" * 100_000 + b"\r\n\r\n",
+    b"GET /health HTTP/1.1\r\n" + b"".join(b"X-Padding-%d: %s\r\n" % (i, b"x" * 1000) for i in range(80)) + b"\r\n",
+], ids=["one-long-line", "many-lines"])
+def test_oversized_headers_are_rejected(head):
+    with running_service(handle=stub_handle()) as address:
+        assert raw_request(address, head) == 431
+        assert raw_request(address, b"GET /health HTTP/1.1\r\nno colon here\r\n\r\n") == 400
+        assert raw_request(address, b"POST /jobs HTTP/1.1\r\nContent-Length: -1\r\n\r\n") == 400
@@ -0,0 +1,62 @@
+import threading
+
+from agents import PIPELINE, ethics_checker, iter_pipeline, risk_forecaster
+from conftest import stub_handle
+
+
+def run(handle, project_input, pipeline=PIPELINE, fixed=None):
+    stage_info = {}
+    stages = dict(iter_pipeline(handle, project_input, pipeline=pipeline, stage_info=stage_info, fixed=fixed))
+    assert not any("error" in result for result in stages.values())
+    return stages, stage_info
+
+
+def test_concurrent_pipelines_compute_a_shared_stage_once(program):
+    # "shared" reads nothing that differs between the two runs; "own" does.
+    shared_input = program("shared")
+    pipeline = {
+        "shared": ((), (), lambda ctx: risk_forecaster(ctx["handle"], shared_input)),
+        "own": (("shared",), ("project_input",), lambda ctx: ethics_checker(ctx["handle"], ctx["project_input"], ctx["shared"])),
+    }
+    handle = stub_handle(0.2)
+    infos = {}
+    start = threading.Barrier(2)
+
+    def scenario(label):
+        start.wait()
+        infos[label] = run(handle, program(label), pipeline)[1]
+
+    threads = [threading.Thread(target=scenario, args=(label,)) for label in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert handle.backend.calls == 3  # one "shared", one "own" per scenario
+    assert sorted(info["shared"]["reused"] for info in infos.values()) == [False, True]
+    assert not any(info["own"]["reused"] for info in infos.values())
+
+
+def test_stages_rerun_only_when_their_inputs_change(program):
+    handle = stub_handle()
+    first, _ = run(handle, program("base"))
+    calls = handle.backend.calls
+
+    # Same risks, new description: trade-offs and comms only read the risks.
+    _, info = run(handle, program("variant"), fixed={"risks": first["risks"]})
+    assert {name for name, i in info.items() if not i["reused"]} == {"ethics", "talent"}
+    assert handle.backend.calls - calls == 2
+
+    # Different risks: everything downstream of them is recomputed.
+    changed = {"risks": [dict(first["risks"]["risks"][0], probability="99%"), *first["risks"]["risks"][1:]]}
+    calls = handle.backend.calls
+    _, info = run(handle, program("variant"), fixed={"risks": changed})
+    assert {name for name, i in info.items() if not i["reused"]} == {"ethics", "talent", "tradeoffs", "comms"}
+    assert handle.backend.calls - calls == 4
+
+
+def test_fake_backend_answers_depend_on_the_description(program):
+    handle = stub_handle()
+    a, _ = run(handle, program("a"))
+    b, _ = run(handle, program("b"))
+    assert [r["probability"] for r in a["risks"]["risks"]] != [r["probability"] for r in b["risks"]["risks"]]